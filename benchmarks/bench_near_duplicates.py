@@ -0,0 +1,81 @@
+r"""
+benchmarks/bench_near_duplicates.py
+
+Times DataScrubber.find_near_duplicate_records on synthetic customer tables of growing
+size, to show that the blocked comparison scales close to linearly with the number of
+customers (a pairwise comparison would take 100x longer for every 10x more customers).
+
+About 5% of the synthetic customers are near-duplicates of another customer: the same
+person with a changed case, added punctuation, swapped name order or a typo, and their
+birthday written in a different date format.
+
+To run, open a terminal in the root project folder and run one of the following commands
+(optionally followed by the table sizes to time):
+
+    py benchmarks\bench_near_duplicates.py 10000 100000 1000000
+    python3 benchmarks/bench_near_duplicates.py 10000 100000 1000000
+"""
+
+import pathlib
+import random
+import sys
+import time
+from typing import List
+
+import pandas as pd
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from scripts.data_preparation.data_scrubber import DataScrubber  # noqa: E402
+
+FIRST_NAMES = ["William", "Susan", "Dan", "Tony", "Jason", "Hermione", "Tiffany", "Wylie", "Aaron", "Maria",
+               "James", "Linda", "Robert", "Patricia", "Michael", "Jennifer", "David", "Elizabeth", "Joseph", "Sarah"]
+LAST_NAMES = ["White", "Coyote", "Brown", "Stark", "Bourne", "Granger", "James", "Johnson", "Gillespie", "Garcia",
+              "Smith", "Jones", "Miller", "Davis", "Wilson", "Moore", "Taylor", "Anderson", "Thomas", "Jackson"]
+REGIONS = ["East", "West", "North", "South"]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+def make_variant(name: str, rng: random.Random) -> str:
+    """Return a slightly different spelling of a name."""
+    first, last = name.split(" ", 1)
+    change = rng.randrange(4)
+    if change == 0:
+        return name.upper()
+    if change == 1:
+        return f"{last}, {first}"
+    if change == 2:
+        return f"{first}. {last}"
+    position = rng.randrange(1, len(last))
+    return f"{first} {last[:position]}{last[position + 1:]}"
+
+def make_customers(size: int, duplicate_rate: float = 0.05, seed: int = 44632) -> pd.DataFrame:
+    """Build a synthetic customers table with some near-duplicate customers in it."""
+    rng = random.Random(seed)
+    originals = size - int(size * duplicate_rate)
+    rows = []
+    for customer_id in range(originals):
+        birthday = pd.Timestamp("1930-01-01") + pd.Timedelta(days=rng.randrange(30_000))
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        rows.append((customer_id, name, rng.choice(REGIONS), birthday.strftime("%Y-%m-%d")))
+    for customer_id in range(originals, size):
+        _, name, region, birthday = rows[rng.randrange(originals)]
+        birthday = pd.Timestamp(birthday).strftime("%m/%d/%Y")
+        rows.append((customer_id, make_variant(name, rng), region, birthday))
+    return pd.DataFrame(rows, columns=["CustomerID", "Name", "Region", "Birthday"])
+
+def main(sizes: List[int]) -> None:
+    """Time near-duplicate detection for each table size."""
+    print(f"{'customers':>12} {'seconds':>10} {'us/customer':>12} {'duplicates':>11}")
+    for size in sizes:
+        df = make_customers(size)
+        start = time.perf_counter()
+        merge_map = DataScrubber(df).find_near_duplicate_records(
+            "CustomerID", "Name", blocking_columns=["Region", "Birthday"], date_columns=["Birthday"])
+        seconds = time.perf_counter() - start
+        print(f"{size:>12,} {seconds:>10.2f} {seconds / size * 1e6:>12.1f} {len(merge_map):>11,}")
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
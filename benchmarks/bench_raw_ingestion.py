@@ -0,0 +1,78 @@
+r"""
+benchmarks/bench_raw_ingestion.py
+
+Writes synthetic raw sales (see bench_warehouse_backends.py) split over many CSV files,
+as a drop directory of daily store deliveries would hold them, then times reading them
+all into one DataFrame two ways: one file after another with pd.read_csv, and with
+raw_files.iter_csv_files as data_prep.py does (files read on threads, parsed on
+processes). Both must return the same rows. The number of parser processes defaults
+to the number of CPU cores; with one core, files are parsed in the calling thread.
+
+The files are written to a temporary folder and deleted afterwards.
+
+To run, open a terminal in the root project folder and run one of the following commands
+(optionally followed by the number of sales rows, the number of files and the number of
+parser processes):
+
+    py benchmarks\bench_raw_ingestion.py 1000000 200 4
+    python3 benchmarks/bench_raw_ingestion.py 1000000 200 4
+"""
+
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from scripts.data_preparation.raw_files import SOURCE_FILE_COLUMN, iter_csv_files  # noqa: E402
+from bench_warehouse_backends import make_tables  # noqa: E402
+
+DEFAULT_SALES = 1_000_000
+DEFAULT_FILES = 200
+
+def read_one_by_one(paths) -> pd.DataFrame:
+    """Read the files sequentially, tagging each row with its file, as a single-threaded loop would."""
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path)
+        df.columns = df.columns.str.strip()
+        df[SOURCE_FILE_COLUMN] = path.name
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def main(sales_count: int, file_count: int, parse_workers: Optional[int] = None) -> None:
+    """Split synthetic sales over file_count CSV files and time reading them back both ways."""
+    sales_df = make_tables(sales_count)["sales"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for part, rows in enumerate(np.array_split(np.arange(sales_count), file_count)):
+            part_df = sales_df.iloc[rows]
+            path = pathlib.Path(tmp_dir).joinpath(f"sales_data_{part:04d}.csv")
+            part_df.to_csv(path, index=False)
+            paths.append(path)
+        size_mb = sum(path.stat().st_size for path in paths) / 2**20
+        print(f"{sales_count:,} sales in {file_count} files ({size_mb:.1f} MB), {os.cpu_count()} CPU cores")
+
+        start = time.perf_counter()
+        expected = read_one_by_one(paths)
+        print(f"  one by one        {time.perf_counter() - start:>7.2f} s")
+
+        start = time.perf_counter()
+        result = pd.concat(iter_csv_files([(path, path.name) for path in paths], parse_workers=parse_workers),
+                           ignore_index=True)
+        print(f"  concurrent        {time.perf_counter() - start:>7.2f} s ({parse_workers or os.cpu_count()} parser(s))")
+        pd.testing.assert_frame_equal(result, expected)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SALES,
+         int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_FILES,
+         int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -0,0 +1,85 @@
+r"""
+benchmarks/bench_reject_sink.py
+
+Times the DataScrubber steps data prep runs (duplicate removal and a cleaning spec)
+over synthetic sales (see bench_warehouse_backends.py), with a share of the rows made
+to fail a rule, once without a reject sink and once recording the dropped rows to a
+RejectSink.
+
+The scrub time is what the prep code waits for; with the sink, the rows are converted
+and written by its background thread, and the extra time spent flushing them when the
+sink is closed is reported separately. The CPU time of the scrubbing thread alone is
+reported too: it is the cost the sink adds to the prep code's own path, while the wall
+time also includes the writer thread competing for the CPU (on a single core, all of
+its work). Each run is repeated a few times and the fastest is reported.
+
+To run, open a terminal in the root project folder and run one of the following commands
+(optionally followed by the number of sales rows and the share of them rejected):
+
+    py benchmarks\bench_reject_sink.py 1000000 0.1
+    python3 benchmarks/bench_reject_sink.py 1000000 0.1
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from scripts.data_preparation.data_scrubber import DataScrubber  # noqa: E402
+from scripts.data_preparation.reject_sink import RejectSink  # noqa: E402
+from bench_warehouse_backends import make_tables  # noqa: E402
+
+DEFAULT_SALES = 1_000_000
+DEFAULT_REJECTED_SHARE = 0.1
+REPEATS = 7
+
+SCRUB_SPEC = {
+    'required': ['CustomerID', 'ProductID', 'SaleAmount'],
+    'ranges': {'SaleAmount': (0, 10_000)},
+}
+
+def main(sales_count: int, rejected_share: float) -> None:
+    """Scrub synthetic sales with and without a reject sink and report the time of each."""
+    sales_df = make_tables(sales_count)["sales"]
+    rng = np.random.default_rng(44632)
+    bad_rows = rng.random(sales_count) < rejected_share
+    sales_df.loc[bad_rows, "SaleAmount"] = -1.0  # Out of range, so rejected
+    print(f"{sales_count:,} sales, {bad_rows.sum():,} rejected")
+
+    best_without, cpu_without = float("inf"), float("inf")
+    best_with, cpu_with, best_close = float("inf"), float("inf"), float("inf")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for _ in range(REPEATS):  # Alternate the two, so both see the same machine load
+            start, start_cpu = time.perf_counter(), time.thread_time()
+            scrubber = DataScrubber(sales_df.copy(), table_name="sales")
+            scrubber.remove_duplicate_records()
+            scrubber.apply_cleaning_spec(SCRUB_SPEC)
+            best_without = min(best_without, time.perf_counter() - start)
+            cpu_without = min(cpu_without, time.thread_time() - start_cpu)
+
+            sink = RejectSink(pathlib.Path(tmp_dir))
+            start, start_cpu = time.perf_counter(), time.thread_time()
+            scrubber = DataScrubber(sales_df.copy(), reject_sink=sink, table_name="sales")
+            scrubber.remove_duplicate_records()
+            scrubber.apply_cleaning_spec(SCRUB_SPEC)
+            scrubbed, scrubbed_cpu = time.perf_counter(), time.thread_time()
+            sink.close()
+            best_with = min(best_with, scrubbed - start)
+            cpu_with = min(cpu_with, scrubbed_cpu - start_cpu)
+            best_close = min(best_close, time.perf_counter() - scrubbed)
+
+    print(f"{'':<19} {'wall s':>7} {'thread CPU s':>13}")
+    print(f"scrub without sink {best_without:>7.3f} {cpu_without:>13.3f}")
+    print(f"scrub with sink    {best_with:>7.3f} {cpu_with:>13.3f}"
+          f"   ({best_with / best_without - 1:+.0%} wall, {cpu_with / cpu_without - 1:+.0%} CPU), then {best_close:.3f} s flushing on close")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SALES,
+         float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REJECTED_SHARE)
@@ -0,0 +1,92 @@
+r"""
+benchmarks/bench_sampled_queries.py
+
+Loads synthetic sales (see bench_warehouse_backends.py) into a SQLite data warehouse,
+builds the stratified samples etl_to_dw.py maintains, then runs exploratory aggregates
+both exactly on the sales table and approximately on each sample.
+
+For each query and sample rate it reports the query time, the median relative error
+of the estimates, and how many of the exact answers fall within the 95% bounds
+(ideally about 95%).
+
+To run, open a terminal in the root project folder and run one of the following commands
+(optionally followed by the number of sales rows):
+
+    py benchmarks\bench_sampled_queries.py 1000000
+    python3 benchmarks/bench_sampled_queries.py 1000000
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from scripts import etl_to_dw  # noqa: E402
+from scripts.data_warehouse import sales_samples  # noqa: E402
+from bench_warehouse_backends import make_tables  # noqa: E402
+
+DEFAULT_SALES = 1_000_000
+
+# Query name -> (exact query, approximate_aggregate keyword arguments); the exact query
+# returns the group columns followed by the aggregate, as Exact
+EXPLORATION_QUERIES = {
+    "sales by state": (
+        "SELECT StateCode, SUM(SaleAmount) AS Exact FROM sales_with_state GROUP BY StateCode",
+        dict(aggregate="sum", group_by=["StateCode"]),
+    ),
+    "sales by month": (
+        "SELECT substr(SaleDate, 1, 7) AS SaleMonth, SUM(SaleAmount) AS Exact FROM sales GROUP BY SaleMonth",
+        dict(aggregate="sum", group_by=["SaleMonth"]),
+    ),
+    "transactions by store": (
+        "SELECT StoreID, COUNT(*) AS Exact FROM sales GROUP BY StoreID",
+        dict(aggregate="count", group_by=["StoreID"]),
+    ),
+    "average sale by campaign": (
+        "SELECT CampaignID, AVG(SaleAmount) AS Exact FROM sales GROUP BY CampaignID",
+        dict(aggregate="avg", group_by=["CampaignID"]),
+    ),
+    "Texas sales by product since July": (
+        """SELECT ProductID, SUM(SaleAmount) AS Exact FROM sales_with_state
+           WHERE StateCode = 'TX' AND SaleDate >= '2024-07-01' GROUP BY ProductID""",
+        dict(aggregate="sum", group_by=["ProductID"], where="StateCode = ? AND SaleDate >= ?", params=("TX", "2024-07-01")),
+    ),
+}
+
+def main(sales_count: int) -> None:
+    """Build the samples over synthetic sales and compare approximate and exact exploration queries."""
+    tables = make_tables(sales_count)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with etl_to_dw.open_warehouse("sqlite", pathlib.Path(tmp_dir).joinpath("bench.db")) as warehouse:
+            warehouse.create_schema()
+            warehouse.insert_to_table(etl_to_dw.encode_states(warehouse, tables["sales"]), "sales")
+            warehouse.insert_to_table(tables["products"], "products")
+            start = time.perf_counter()
+            sales_samples.update_sales_samples(warehouse.cursor, etl_to_dw.sale_dates_of(tables["sales"]))
+            warehouse.commit()
+            print(f"{sales_count:,} sales, samples built in {time.perf_counter() - start:.2f} s")
+            for rate, rows in warehouse.query("SELECT SampleRate, COUNT(*) FROM sales_sample GROUP BY SampleRate").values:
+                print(f"  {rate:.0%} sample: {int(rows):,} rows ({rows / sales_count:.1%} of sales)")
+
+            print(f"\n{'query':<36} {'sample':>6} {'seconds':>8} {'median error':>13} {'in bounds':>10}")
+            for name, (exact_sql, kwargs) in EXPLORATION_QUERIES.items():
+                start = time.perf_counter()
+                exact = warehouse.query(exact_sql)
+                print(f"{name:<36} {'exact':>6} {time.perf_counter() - start:>8.3f}")
+                group_by = kwargs.get("group_by", [])
+                for rate in sales_samples.DEFAULT_SAMPLE_RATES:
+                    start = time.perf_counter()
+                    approximate = sales_samples.approximate_aggregate(warehouse.cursor, rate=rate, **kwargs)
+                    seconds = time.perf_counter() - start
+                    both = exact.merge(approximate, on=group_by, how="left")
+                    error = ((both["Estimate"] - both["Exact"]).abs() / both["Exact"].abs()).median()
+                    in_bounds = ((both["Lower"] <= both["Exact"]) & (both["Exact"] <= both["Upper"])).mean()
+                    print(f"{'':<36} {rate:>6.0%} {seconds:>8.3f} {error:>13.2%} {in_bounds:>10.0%}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SALES)
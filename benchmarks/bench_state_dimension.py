@@ -0,0 +1,119 @@
+r"""
+benchmarks/bench_state_dimension.py
+
+Compares the SQLite data warehouse with State and StateCode stored as text on every
+sales row (the layout before the states table) against sales storing only a StateKey
+into states, as etl_to_dw.py does now. Both are loaded with the same synthetic sales
+(see bench_warehouse_backends.py) and the same sales indexes, then the file sizes and
+the times of a few scans of sales are reported.
+
+Each scan is timed three ways: on the old layout, on the new layout through the
+sales_with_state compatibility view (as existing queries would run unchanged), and on
+the new layout written against StateKey. The first two always return the same rows, as
+do all three for the aggregates.
+
+To run, open a terminal in the root project folder and run one of the following commands
+(optionally followed by the number of sales rows):
+
+    py benchmarks\bench_state_dimension.py 1000000
+    python3 benchmarks/bench_state_dimension.py 1000000
+"""
+
+import pathlib
+import sys
+import tempfile
+
+import pandas as pd
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from scripts import etl_to_dw  # noqa: E402
+from bench_warehouse_backends import make_tables, time_query  # noqa: E402
+
+DEFAULT_SALES = 1_000_000
+
+# The sales table as etl_to_dw.py created it before State and StateCode moved to states
+TEXT_STATES_SALES_DDL = """
+    CREATE TABLE sales (
+        TransactionID INTEGER PRIMARY KEY,
+        CustomerID INTEGER,
+        ProductID INTEGER,
+        StoreID INTEGER,
+        CampaignID INTEGER,
+        SaleAmount REAL,
+        SaleDate TEXT,
+        State TEXT,
+        Discount REAL,
+        StateCode TEXT
+    )
+"""
+SALES_INDEXES_DDL = [
+    "CREATE INDEX idx_sales_saledate ON sales (SaleDate)",
+    "CREATE INDEX idx_sales_customerid ON sales (CustomerID)",
+]
+
+# Query name -> (query on the old layout, query through the compatibility view, query using StateKey)
+SCAN_QUERIES = {
+    "total sales (full scan)": (
+        "SELECT SUM(SaleAmount) AS Total FROM sales",
+        "SELECT SUM(SaleAmount) AS Total FROM sales_with_state",
+        "SELECT SUM(SaleAmount) AS Total FROM sales",
+    ),
+    "sales by state": (
+        "SELECT StateCode, SUM(SaleAmount) AS Total FROM sales GROUP BY StateCode ORDER BY StateCode",
+        "SELECT StateCode, SUM(SaleAmount) AS Total FROM sales_with_state GROUP BY StateCode ORDER BY StateCode",
+        """SELECT st.StateCode, t.Total
+           FROM (SELECT StateKey, SUM(SaleAmount) AS Total FROM sales GROUP BY StateKey) AS t
+           JOIN states AS st ON st.StateKey = t.StateKey ORDER BY st.StateCode""",
+    ),
+    "sales in one state": (
+        "SELECT COUNT(*) AS Sales, SUM(SaleAmount) AS Total FROM sales WHERE StateCode = 'TX'",
+        "SELECT COUNT(*) AS Sales, SUM(SaleAmount) AS Total FROM sales_with_state WHERE StateCode = 'TX'",
+        "SELECT COUNT(*) AS Sales, SUM(SaleAmount) AS Total FROM sales WHERE StateKey IN (SELECT StateKey FROM states WHERE StateCode = 'TX')",
+    ),
+    "all sales rows": (
+        "SELECT * FROM sales ORDER BY TransactionID",
+        "SELECT * FROM sales_with_state ORDER BY TransactionID",
+        "SELECT * FROM sales ORDER BY TransactionID",
+    ),
+}
+
+class TextStatesWarehouse(etl_to_dw.SQLiteWarehouse):
+    """SQLite warehouse with only the sales table, laid out as before the states table."""
+
+    def create_schema(self) -> None:
+        self.cursor.execute(TEXT_STATES_SALES_DDL)
+        for ddl in SALES_INDEXES_DDL:
+            self.cursor.execute(ddl)
+
+def main(sales_count: int) -> None:
+    """Load sales in both layouts and report their file sizes and scan times."""
+    sales_df = make_tables(sales_count)["sales"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        old_path, new_path = pathlib.Path(tmp_dir).joinpath("text_states.db"), pathlib.Path(tmp_dir).joinpath("state_keys.db")
+        with TextStatesWarehouse(old_path) as old, etl_to_dw.open_warehouse("sqlite", new_path) as new:
+            old.create_schema()
+            old.insert_to_table(sales_df, "sales")
+            old.commit()
+            new.create_schema()
+            new.insert_to_table(etl_to_dw.encode_states(new, sales_df), "sales")
+            new.commit()
+
+            old_mb, new_mb = old_path.stat().st_size / 2**20, new_path.stat().st_size / 2**20
+            print(f"{sales_count:,} sales")
+            print(f"  file size {old_mb:.1f} MB -> {new_mb:.1f} MB ({1 - new_mb / old_mb:.0%} smaller)")
+
+            print(f"\n{'query':<26} {'text s':>8} {'view s':>8} {'key s':>8}")
+            for name, (old_sql, view_sql, key_sql) in SCAN_QUERIES.items():
+                expected = old.query(old_sql)
+                pd.testing.assert_frame_equal(new.query(view_sql), expected)
+                if "*" not in key_sql:  # SELECT * on the new layout has StateKey instead of the state columns
+                    pd.testing.assert_frame_equal(new.query(key_sql), expected)
+                times = [time_query(old, old_sql), time_query(new, view_sql), time_query(new, key_sql)]
+                print(f"{name:<26} " + " ".join(f"{t:>8.3f}" for t in times))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SALES)
@@ -0,0 +1,167 @@
+r"""
+benchmarks/bench_warehouse_backends.py
+
+Loads the same synthetic data warehouse into the SQLite (row store) and DuckDB (column
+store) backends of etl_to_dw.py, then times the analytic queries the notebooks run
+(olap/olap_analysis_gillespie.ipynb and spark_juypter_gillespie.ipynb) against both.
+
+The synthetic tables have the shape of the real ones: a few dozen stores, products,
+suppliers and campaigns, thousands of customers, and as many sales as asked for,
+spread over two years and all 50 states. Each query is run a few times and the
+fastest run is reported, after checking that both backends return the same rows.
+
+The warehouse files are written to a temporary folder and deleted afterwards.
+
+To run, open a terminal in the root project folder and run one of the following commands
+(optionally followed by the number of sales rows):
+
+    py benchmarks\bench_warehouse_backends.py 1000000
+    python3 benchmarks/bench_warehouse_backends.py 1000000
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from scripts import etl_to_dw  # noqa: E402
+from scripts.data_preparation.data_scrubber import DataScrubber  # noqa: E402
+
+DEFAULT_SALES = 1_000_000
+REPEATS = 3
+
+NOTEBOOK_QUERIES = {
+    "sales by state": """
+        SELECT StateCode, SUM(SaleAmount) AS TotalSales
+        FROM sales_with_state GROUP BY StateCode ORDER BY TotalSales DESC
+    """,
+    "sales by state since July": """
+        SELECT StateCode, SUM(SaleAmount) AS TotalSales
+        FROM sales_with_state WHERE SaleDate >= '2024-07-01' GROUP BY StateCode ORDER BY TotalSales DESC
+    """,
+    "sales by supplier and store": """
+        SELECT su.SupplierName, st.StoreName, SUM(s.SaleAmount) AS TotalSales
+        FROM sales AS s
+        JOIN products AS p ON s.ProductID = p.ProductID
+        JOIN suppliers AS su ON p.Supplier = su.SupplierID
+        JOIN stores AS st ON s.StoreID = st.StoreID
+        GROUP BY su.SupplierName, st.StoreName ORDER BY su.SupplierName, st.StoreName
+    """,
+    "sales by campaign and product": """
+        SELECT c.CampaignName, p.ProductName, SUM(s.SaleAmount) AS TotalSales
+        FROM sales AS s
+        JOIN products AS p ON s.ProductID = p.ProductID
+        JOIN campaigns AS c ON s.CampaignID = c.CampaignID
+        GROUP BY c.CampaignName, p.ProductName ORDER BY c.CampaignName, p.ProductName
+    """,
+    "top customers by total spent": """
+        SELECT c.Name AS name, SUM(s.SaleAmount) AS total_spent
+        FROM sales AS s JOIN customers AS c ON s.CustomerID = c.CustomerID
+        GROUP BY c.Name ORDER BY total_spent DESC, name LIMIT 10
+    """,
+    "sales by month": """
+        SELECT substr(SaleDate, 1, 7) AS Month, SUM(SaleAmount) AS TotalSales
+        FROM sales GROUP BY Month ORDER BY Month
+    """,
+    "notebook join (all rows)": """
+        SELECT sales.StoreID, sales.CampaignID, sales.SaleAmount, sales.SaleDate, sales.StateCode,
+               sales.ProductID, products.Supplier, products.ProductName, suppliers.SupplierName,
+               stores.StoreName, campaigns.CampaignName
+        FROM sales_with_state AS sales
+        JOIN products ON sales.ProductID = products.ProductID
+        JOIN suppliers ON products.Supplier = suppliers.SupplierID
+        JOIN stores ON sales.StoreID = stores.StoreID
+        JOIN campaigns ON sales.CampaignID = campaigns.CampaignID
+    """,
+}
+
+def make_tables(sales_count: int, seed: int = 44632) -> Dict[str, pd.DataFrame]:
+    """Build a synthetic set of prepared tables with sales_count sales."""
+    rng = np.random.default_rng(seed)
+    customer_count, product_count, store_count = max(sales_count // 100, 10), 50, 20
+    state_codes = sorted(set(DataScrubber.state_codes.values()))
+    code_to_state = {code: state for state, code in DataScrubber.state_codes.items()}
+    sale_state_codes = rng.choice(state_codes, sales_count)
+    return {
+        "customers": pd.DataFrame({
+            "CustomerID": np.arange(customer_count), "Name": [f"Customer {c}" for c in range(customer_count)],
+            "Region": rng.choice(["East", "West", "North", "South"], customer_count), "JoinDate": "1/1/24",
+            "ReferringCustomer": pd.array([None] * customer_count, dtype="Int64"),
+            "Birthday": "1990-01-01", "StandardJoinDate": "2024-01-01"}),
+        "products": pd.DataFrame({
+            "ProductID": np.arange(product_count), "ProductName": [f"product {p}" for p in range(product_count)],
+            "Category": rng.choice(["Electronics", "Clothing", "Sports"], product_count),
+            "UnitPrice": rng.uniform(1, 1000, product_count).round(2),
+            "Supplier": rng.integers(0, 10, product_count), "RemainingInventory": rng.integers(0, 1000, product_count)}),
+        "sales": pd.DataFrame({
+            "TransactionID": np.arange(sales_count),
+            "SaleDate": (pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, sales_count), unit="D")).strftime("%Y-%m-%d"),
+            "CustomerID": rng.integers(0, customer_count, sales_count),
+            "ProductID": rng.integers(0, product_count, sales_count),
+            "StoreID": rng.integers(0, store_count, sales_count),
+            "CampaignID": rng.integers(0, 5, sales_count),
+            "SaleAmount": rng.uniform(1, 5000, sales_count).round(2),
+            "State": [code_to_state[code] for code in sale_state_codes],
+            "Discount": rng.uniform(0, 20, sales_count).round(2),
+            "StateCode": sale_state_codes}),
+        "suppliers": pd.DataFrame({"SupplierID": np.arange(10), "SupplierName": [f"Supplier {s}" for s in range(10)]}),
+        "stores": pd.DataFrame({
+            "StoreID": np.arange(store_count), "StoreName": [f"Store {s}" for s in range(store_count)],
+            "StoreLocation": [f"City {s}" for s in range(store_count)]}),
+        "campaigns": pd.DataFrame({"CampaignID": np.arange(5), "CampaignName": [f"Campaign {c}" for c in range(5)]}),
+    }
+
+def time_query(warehouse, sql: str) -> float:
+    """Return the fastest of REPEATS runs of the query, in seconds."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        warehouse.query(sql)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(sales_count: int) -> None:
+    """Load both backends with the same synthetic data and time the notebook queries on each."""
+    tables = make_tables(sales_count)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        warehouses = {}
+        print(f"Loading {sales_count:,} sales into each backend")
+        for backend in etl_to_dw.WAREHOUSE_BACKENDS:
+            db_path = pathlib.Path(tmp_dir).joinpath(f"bench.{backend}")
+            warehouse = etl_to_dw.open_warehouse(backend, db_path)
+            start = time.perf_counter()
+            warehouse.create_schema()
+            for table_name in etl_to_dw.TABLE_NAMES:
+                df = tables[table_name]
+                if table_name == "sales":
+                    df = etl_to_dw.encode_states(warehouse, df)
+                warehouse.insert_to_table(df, table_name)
+            warehouse.commit()
+            if backend == "duckdb":
+                # Move the write-ahead log into the database file, so the load time and file size include it
+                warehouse.conn.execute("CHECKPOINT")
+            print(f"  {backend:<8} load {time.perf_counter() - start:>7.2f} s, file {db_path.stat().st_size / 2**20:>7.1f} MB")
+            warehouses[backend] = warehouse
+
+        print(f"\n{'query':<32} {'sqlite s':>9} {'duckdb s':>9} {'speedup':>8}")
+        for name, sql in NOTEBOOK_QUERIES.items():
+            results = [warehouse.query(sql) for warehouse in warehouses.values()]
+            if "LIMIT" not in sql:  # Same rows from both backends (ties may order differently under LIMIT)
+                pd.testing.assert_frame_equal(results[0], results[1], check_dtype=False, check_like=True)
+            sqlite_s, duckdb_s = (time_query(warehouse, sql) for warehouse in warehouses.values())
+            print(f"{name:<32} {sqlite_s:>9.3f} {duckdb_s:>9.3f} {sqlite_s / duckdb_s:>7.1f}x")
+
+        for warehouse in warehouses.values():
+            warehouse.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SALES)
@@ -0,0 +1,44 @@
+"""
+Cleaning Specs
+File: scripts/data_preparation/cleaning_specs.py
+
+One declarative cleaning spec per table, applied with DataScrubber.apply_cleaning_spec.
+Adding a rule here adds a vectorized check to the table's single filtering pass,
+not another pass over the whole table.
+
+Spec keys (all optional):
+    strip / lower / upper (list): Columns to trim (and lowercase / uppercase).
+    types (dict): Column -> 'datetime', 'numeric' (invalid values become missing) or a pandas dtype.
+    required (list): Columns that must have a value.
+    dates (dict): Column -> {'min': ISO date, 'max': ISO date, 'future_years': int}; the column
+                  must hold a valid ISO-8601 date within the bounds, and is converted to datetime.
+    ranges (dict): Column -> (lower bound, upper bound); None leaves that side open.
+    derived (dict): New column -> (kind, source column), kind being 'standard_datetime'
+                    (source parsed as datetime) or 'state_code' (2-character code of a state name).
+    fill_missing: Value used to fill any remaining missing values.
+"""
+
+CUSTOMERS_SPEC = {
+    "strip": ["Name"],
+    "required": ["CustomerID", "Name"],
+    "dates": {"Birthday": {"min": "1900-01-01", "max": "2025-12-31", "future_years": 1}},
+    "derived": {"StandardJoinDate": ("standard_datetime", "JoinDate")},
+    "fill_missing": "N/A",
+}
+
+PRODUCTS_SPEC = {
+    "strip": ["ProductName"],
+    "required": ["ProductID", "ProductName"],
+    "fill_missing": "N/A",
+}
+
+SALES_SPEC = {
+    "types": {"SaleDate": "datetime"},
+    "required": ["CustomerID", "TransactionID", "ProductID", "SaleDate"],
+    "derived": {"StateCode": ("state_code", "State")},
+    "fill_missing": "N/A",
+}
+
+GENERIC_SPEC = {
+    "fill_missing": "N/A",
+}
@@ -20,14 +20,31 @@ Choose the correct command for your OS to run this script.
 
 py scripts\data_prep.py
 python3 scripts\data_prep.py
+
+Each table is read from every raw file matching its glob pattern in RAW_FILE_PATTERNS
+(e.g. all the daily sales files of every store, sales_data*.csv); the files are read
+and parsed concurrently and each row is tagged with its source file. Use
+--raw-glob TABLE=PATTERN to read a table from other files.
+
+Add --load to also load the prepared tables into the data warehouse in the same
+process. The DataFrames are handed straight to the loader, so the prepared CSV
+files no longer have to be written and read back first; they are still saved,
+in the background, unless --no-save is given.
 """
 
+import argparse
+import glob
 import pathlib
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
 import pandas as pd
 import prepare_customers_data
 import prepare_products_data
 import prepare_sales_data
+from raw_files import SOURCE_FILE_COLUMN, iter_csv_files
+from reject_sink import RejectSink
 
 # For local imports, temporarily add project root to Python sys.path
 PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent.parent # 3 levels up
@@ -35,6 +52,7 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 # Now we can import local modules
+from scripts import etl_to_dw
 from scripts.data_preparation import prepare_generic_data
 from utils.logger import logger 
 
@@ -42,11 +60,51 @@ from utils.logger import logger
 DATA_DIR: pathlib.Path = PROJECT_ROOT.joinpath("data")
 RAW_DATA_DIR: pathlib.Path = DATA_DIR.joinpath("raw")
 PREPARED_DATA_DIR: pathlib.Path = DATA_DIR.joinpath("prepared")
-
-def read_raw_data(file_name: str) -> pd.DataFrame:
-    """Read raw data from CSV."""
-    file_path: pathlib.Path = RAW_DATA_DIR.joinpath(file_name)
-    return pd.read_csv(file_path)
+REJECTS_DATA_DIR: pathlib.Path = DATA_DIR.joinpath("rejects")
+
+# Table name -> glob pattern (relative to RAW_DATA_DIR) of its raw CSV files
+RAW_FILE_PATTERNS: Dict[str, str] = {
+    "customers": "customers_data*.csv",
+    "products": "products_data*.csv",
+    "sales": "sales_data*.csv",
+    "stores": "stores_data*.csv",
+    "campaigns": "campaigns_data*.csv",
+    "suppliers": "suppliers_data*.csv",
+}
+
+def read_raw_files(pattern: str) -> pd.DataFrame:
+    """
+    Read every raw CSV file matching a glob pattern, concurrently, into one DataFrame.
+
+    Parameters:
+        pattern (str): Glob pattern, relative to RAW_DATA_DIR (or absolute). Use ** to match subfolders.
+
+    Returns:
+        pd.DataFrame: The rows of all the files, in file name order, with a SourceFile column
+                      giving each row's file (relative to RAW_DATA_DIR when inside it).
+
+    Raises:
+        FileNotFoundError: If no file matches the pattern.
+        ValueError: If every matching file is empty.
+    """
+    paths = sorted(pathlib.Path(p) for p in glob.glob(str(RAW_DATA_DIR.joinpath(pattern)), recursive=True))
+    if not paths:
+        raise FileNotFoundError(f"No raw data files match '{pattern}' in {RAW_DATA_DIR}")
+    files = [(path, path.relative_to(RAW_DATA_DIR).as_posix() if path.is_relative_to(RAW_DATA_DIR) else str(path))
+             for path in paths]
+
+    frames = []
+    for (_, source_file), df in zip(files, iter_csv_files(files)):
+        if df.columns.empty:
+            logger.warning(f"Skipping empty raw data file {source_file}")
+            continue
+        logger.info(f"Read {len(df)} rows from {source_file}")
+        frames.append(df)
+    if not frames:
+        raise ValueError(f"Every raw data file matching '{pattern}' in {RAW_DATA_DIR} is empty")
+    df = pd.concat(frames, ignore_index=True)
+    logger.info(f"Read {len(df)} rows from {len(files)} file(s) matching {pattern}")
+    return df
 
 def save_prepared_data(df: pd.DataFrame, file_name: str) -> None:
     """Save cleaned data to CSV."""
@@ -54,45 +112,128 @@ def save_prepared_data(df: pd.DataFrame, file_name: str) -> None:
     df.to_csv(file_path, index=False)
     logger.info(f"Data saved to {file_path}")
 
-def main() -> None:
-    """Main function for pre-processing customer, product, and sales data."""
-    logger.info("======================")
-    logger.info("STARTING data_prep.py")
-    logger.info("======================")
+def to_arrow_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a prepared DataFrame to Arrow-backed dtypes for loading into the warehouse.
+
+    The values match what reading the prepared CSV back would give: the "N/A" fill
+    value becomes a real missing value and dates become ISO-8601 strings.
+    """
+    df = df.replace({"N/A": None}).infer_objects()
+    for column in df.select_dtypes(include="datetime").columns:
+        date_format = "%Y-%m-%d" if (df[column].dt.normalize() == df[column]).all() else "%Y-%m-%d %H:%M:%S"
+        df[column] = df[column].dt.strftime(date_format)
+    return df.convert_dtypes(dtype_backend="pyarrow")
+
+def prepare_all_tables(reject_sink: RejectSink, save: bool = True,
+                       raw_patterns: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    """
+    Prepare every table.
+
+    Parameters:
+        reject_sink (RejectSink): Sink that receives every row dropped while preparing.
+        save (bool): If True, save the prepared CSV files.
+        raw_patterns (dict, optional): Table name -> glob pattern of its raw files, overriding RAW_FILE_PATTERNS.
+
+    Returns:
+        tuple: (prepared DataFrames keyed by table name, other prepared files for review keyed by
+               file name, e.g. the customers merge map).
+    """
+    prepared: Dict[str, pd.DataFrame] = {}
+    review_files: Dict[str, pd.DataFrame] = {}
+    patterns = {**RAW_FILE_PATTERNS, **(raw_patterns or {})}
 
     logger.info("========================")
     logger.info("Starting CUSTOMERS prep")
     logger.info("========================")
-    prepare_customers_data.main()
+    prepared["customers"], review_files["customers_merge_map.csv"] = prepare_customers_data.main(
+        reject_sink, save, patterns["customers"])
 
     logger.info("========================")
     logger.info("Starting PRODUCTS prep")
     logger.info("========================")
-    prepare_products_data.main()
+    prepared["products"] = prepare_products_data.main(reject_sink, save, patterns["products"])
 
     logger.info("========================")
     logger.info("Starting SALES prep")
     logger.info("========================")
-    prepare_sales_data.main()
+    prepared["sales"] = prepare_sales_data.main(reject_sink, save, patterns["sales"])
 
     logger.info("========================")
     logger.info("Starting STORES prep")
     logger.info("========================")
-    prepare_generic_data.main('stores_data')
+    prepared["stores"] = prepare_generic_data.main('stores_data', reject_sink, save, patterns["stores"])
 
     logger.info("========================")
     logger.info("Starting CAMPAIGNS prep")
     logger.info("========================")
-    prepare_generic_data.main('campaigns_data')
+    prepared["campaigns"] = prepare_generic_data.main('campaigns_data', reject_sink, save, patterns["campaigns"])
 
     logger.info("========================")
     logger.info("Starting SUPPLIERS prep")
     logger.info("========================")
-    prepare_generic_data.main('suppliers_data')
+    prepared["suppliers"] = prepare_generic_data.main('suppliers_data', reject_sink, save, patterns["suppliers"])
+
+    return prepared, review_files
+
+def main(load_to_dw: bool = False, persist_prepared: bool = True, raw_patterns: Optional[Dict[str, str]] = None) -> None:
+    """
+    Main function for pre-processing customer, product, and sales data.
+
+    Parameters:
+        load_to_dw (bool): If True, hand the prepared tables straight to the data warehouse
+                           loader instead of making it read the prepared CSV files back.
+        persist_prepared (bool): If True, save the prepared CSV files. When loading to the
+                                 data warehouse, they are written in the background.
+        raw_patterns (dict, optional): Table name -> glob pattern of its raw files, overriding RAW_FILE_PATTERNS.
+    """
+    logger.info("======================")
+    logger.info("STARTING data_prep.py")
+    logger.info("======================")
+
+    # Every row dropped along the way is recorded, with a reason, in the rejects file of its table
+    with RejectSink(REJECTS_DATA_DIR) as reject_sink:
+        prepared, review_files = prepare_all_tables(reject_sink, save=persist_prepared and not load_to_dw,
+                                                    raw_patterns=raw_patterns)
+
+    logger.info(f"{reject_sink.rejected_count} rejected rows saved to {REJECTS_DATA_DIR}")
+
+    if load_to_dw:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="prepared-writer") as executor:
+            writes = {}
+            if persist_prepared:
+                files = {f"{table_name}_data_prepared.csv": df for table_name, df in prepared.items()}
+                for file_name, df in {**files, **review_files}.items():
+                    writes[file_name] = executor.submit(save_prepared_data, df, file_name)
+            etl_to_dw.load_data_to_db({name: to_arrow_frame(df) for name, df in prepared.items()})
+            logger.info(f"Prepared tables loaded to {etl_to_dw.DB_PATH}")
+
+            # Surface any failed background write (e.g. disk full) instead of losing it
+            failed_writes = []
+            for file_name, future in writes.items():
+                try:
+                    future.result()
+                except OSError as e:
+                    logger.error(f"Could not save {file_name}: {e}")
+                    failed_writes.append(file_name)
+            if failed_writes:
+                raise RuntimeError(f"Failed to save prepared data files: {failed_writes}")
 
     logger.info("======================")
     logger.info("FINISHED data_prep.py")
     logger.info("======================")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Prepare the raw data files.")
+    parser.add_argument("--load", action="store_true", help="Also load the prepared tables into the data warehouse, in-process.")
+    parser.add_argument("--no-save", action="store_true", help="Do not write the prepared CSV files.")
+    parser.add_argument("--raw-glob", action="append", default=[], metavar="TABLE=PATTERN",
+                        help="Read a table from the raw files matching PATTERN (relative to data/raw/), e.g. sales=incoming/*/sales_*.csv.")
+    args = parser.parse_args()
+    if args.no_save and not args.load:
+        parser.error("--no-save only makes sense with --load: the prepared tables would be thrown away.")
+    raw_patterns = dict(option.split("=", 1) for option in args.raw_glob)
+    unknown_tables = set(raw_patterns) - set(RAW_FILE_PATTERNS)
+    if unknown_tables:
+        parser.error(f"Unknown table(s) in --raw-glob: {sorted(unknown_tables)}. Choose from {list(RAW_FILE_PATTERNS)}.")
+    main(load_to_dw=args.load, persist_prepared=not args.no_save, raw_patterns=raw_patterns)
\ No newline at end of file
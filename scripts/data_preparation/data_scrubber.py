@@ -15,20 +15,50 @@ See the associated test script in the tests folder.
 """
 
 import datetime
+import difflib
 import io
+import numpy as np
 import pandas as pd
-from typing import Dict, Tuple, Union, List
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from scripts.data_preparation.reject_sink import RejectSink
 
 
 class DataScrubber:
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, reject_sink: Optional["RejectSink"] = None, table_name: str = "unknown"):
         """
         Initialize the DataScrubber with a DataFrame.
         
         Parameters:
             df (pd.DataFrame): The DataFrame to be scrubbed.
+            reject_sink (RejectSink, optional): Sink that receives every row dropped by the scrubber.
+            table_name (str, optional): Table name recorded alongside rejected rows.
         """
         self.df = df
+        self.reject_sink = reject_sink
+        self.table_name = table_name
+
+    def _keep_rows(self, keep: pd.Series, reason: Union[str, pd.Series],
+                   original: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Keep only the rows where `keep` is True, sending the rest to the reject sink (if any).
+        
+        Parameters:
+            keep (pd.Series): Boolean mask aligned with the DataFrame.
+            reason (str or pd.Series): Reason code recorded for the dropped rows, or a Series
+                                       giving each dropped row's reason code, in order.
+            original (pd.DataFrame, optional): The same rows before their values were converted,
+                                               recorded in the reject sink instead of the converted ones.
+        
+        Returns:
+            pd.DataFrame: Updated DataFrame with only the kept rows.
+        """
+        if self.reject_sink is not None and not keep.all():
+            rejected_from = self.df if original is None else original
+            self.reject_sink.put(rejected_from, reason, self.table_name, mask=~keep.to_numpy())
+        self.df = self.df[keep]
+        return self.df
 
     # A dictionary mapping state names to their corresponding 2-character codes
     state_codes = {
@@ -44,6 +74,103 @@ class DataScrubber:
         'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY'
     }
 
+    def apply_cleaning_spec(self, spec: Dict) -> pd.DataFrame:
+        """
+        Apply a declarative cleaning spec (see cleaning_specs.py) to the DataFrame.
+
+        Column transforms run once per column. Every row rule is evaluated as a vectorized
+        mask over its column and the masks are combined, so the rows are filtered in a
+        single pass however many rules the spec has. Steps run in this order:
+        string normalization ('strip', 'lower', 'upper'), type conversion ('types'),
+        row rules ('required', 'dates', 'ranges'), derived columns ('derived'), and
+        finally 'fill_missing'.
+
+        Parameters:
+            spec (dict): The cleaning spec for this table.
+
+        Returns:
+            pd.DataFrame: Updated DataFrame with the spec applied.
+
+        Raises:
+            ValueError: If a column named in the spec is not found in the DataFrame,
+                        or the spec names an unknown derived column kind.
+        """
+        columns = set(spec.get('strip', [])) | set(spec.get('lower', [])) | set(spec.get('upper', []))
+        columns |= set(spec.get('types', {})) | set(spec.get('required', []))
+        columns |= set(spec.get('dates', {})) | set(spec.get('ranges', {}))
+        columns |= {source for _, source in spec.get('derived', {}).values()}
+        for column in columns:
+            if column not in self.df.columns:
+                raise ValueError(f"Column name '{column}' not found in the DataFrame.")
+
+        # Column transforms. Rejected rows are recorded with their values from before the
+        # transforms (e.g. an unparseable date rather than NaT); under copy-on-write the
+        # shallow copy keeps those values without copying any data up front.
+        original = self.df.copy(deep=False)
+        for column in spec.get('strip', []):
+            self.df[column] = self.df[column].str.strip()
+        for column in spec.get('lower', []):
+            self.df[column] = self.df[column].str.lower().str.strip()
+        for column in spec.get('upper', []):
+            self.df[column] = self.df[column].str.upper().str.strip()
+        for column, new_type in spec.get('types', {}).items():
+            if new_type == 'datetime':
+                self.df[column] = pd.to_datetime(self.df[column], errors='coerce')
+            elif new_type == 'numeric':
+                self.df[column] = pd.to_numeric(self.df[column], errors='coerce')
+            else:
+                self.df[column] = self.df[column].astype(new_type)
+
+        # Row rules, as (reason code, mask of rows passing the rule)
+        rules = []
+        converted_dates = {}
+        for column in spec.get('required', []):
+            rules.append(('missing_required_value', self.df[column].notna()))
+        for column, bounds in spec.get('dates', {}).items():
+            future_threshold = datetime.datetime.now() + datetime.timedelta(days=365 * bounds.get('future_years', 1))
+            dates = pd.to_datetime(self.df[column], format='ISO8601', errors='coerce')
+            rules.append(('invalid_or_future_date', dates.notna() & (dates <= future_threshold)))
+            rules.append(('date_out_of_range', (dates >= datetime.datetime.fromisoformat(bounds['min']))
+                          & (dates <= datetime.datetime.fromisoformat(bounds['max']))))
+            converted_dates[column] = dates
+        for column, (lower_bound, upper_bound) in spec.get('ranges', {}).items():
+            in_range = self.df[column].notna()
+            if lower_bound is not None:
+                in_range &= self.df[column] >= lower_bound
+            if upper_bound is not None:
+                in_range &= self.df[column] <= upper_bound
+            rules.append(('value_out_of_range', in_range))
+
+        if rules:
+            keep = rules[0][1]
+            for _, passes in rules[1:]:
+                keep = keep & passes
+            reasons = None
+            if self.reject_sink is not None:
+                # Each rejected row is recorded under the first rule it fails (only rejected rows are looked at)
+                rejected = ~keep.to_numpy()
+                first_failed = np.argmax([~passes.to_numpy()[rejected] for _, passes in rules], axis=0)
+                reason_codes = list(dict.fromkeys(reason_code for reason_code, _ in rules))
+                rule_reasons = np.array([reason_codes.index(reason_code) for reason_code, _ in rules])
+                reasons = pd.Series(pd.Categorical.from_codes(rule_reasons[first_failed], reason_codes))
+            self._keep_rows(keep, reasons, original)
+        for column, dates in converted_dates.items():
+            self.df[column] = dates[keep.to_numpy()]  # By position: the index may have duplicate labels
+
+        # Derived columns
+        for new_column, (kind, source) in spec.get('derived', {}).items():
+            if kind == 'standard_datetime':
+                self.df[new_column] = pd.to_datetime(self.df[source])
+            elif kind == 'state_code':
+                state_names = self.df[source].astype(str).str.strip().str.lower()
+                self.df[new_column] = state_names.map(self.state_codes).fillna("State not found")
+            else:
+                raise ValueError(f"Unknown derived column kind '{kind}' for column '{new_column}'.")
+
+        if 'fill_missing' in spec:
+            self.df = self.df.fillna(spec['fill_missing'])
+        return self.df
+
     def check_data_consistency_before_cleaning(self) -> Dict[str, Union[pd.Series, int]]:
         """
         Check data consistency before cleaning by calculating counts of null and duplicate entries.
@@ -136,11 +263,11 @@ class DataScrubber:
                 except ValueError:
                     return None # Return none if the format is invalid.
 
-            self.df[column] = self.df[column].apply(safe_convert)
-            self.df = self.df.dropna(subset=[column]) #Drop the none values from conversion failure, or too far in the future dates.
+            converted = self.df[column].apply(safe_convert)
+            self._keep_rows(converted.notna(), 'invalid_or_future_date') #Drop the none values from conversion failure, or too far in the future dates.
+            self.df[column] = converted[converted.notna()]
 
-            self.df = self.df[(self.df[column] >= lower_date) & (self.df[column] <= upper_date)]
-            return self.df
+            return self._keep_rows((self.df[column] >= lower_date) & (self.df[column] <= upper_date), 'date_out_of_range')
         except KeyError:
             raise ValueError(f"Column name '{column}' not found in the DataFrame.")
         except ValueError as e:
@@ -162,10 +289,88 @@ class DataScrubber:
             ValueError: If the specified column not found in the DataFrame.
         """
         try:
-            self.df = self.df[(self.df[column] >= lower_bound) & (self.df[column] <= upper_bound)]
-            return self.df
+            return self._keep_rows((self.df[column] >= lower_bound) & (self.df[column] <= upper_bound), 'value_out_of_range')
         except KeyError:
             raise ValueError(f"Column name '{column}' not found in the DataFrame.")
+
+    def find_near_duplicate_records(self, id_column: str, name_column: str, blocking_columns: Optional[List[str]] = None,
+                                    date_columns: Optional[List[str]] = None, threshold: float = 0.85,
+                                    max_block_size: int = 1000) -> pd.DataFrame:
+        """
+        Find records that are probably the same entity despite small differences (case, punctuation,
+        word order, typos in the name, or the same date written in a different format).
+
+        Rather than comparing every pair of records, records are grouped into blocks that share a
+        normalized name token and the same (normalized) blocking column values. Only pairs within
+        a block are scored, so the work grows with the number of records rather than its square.
+
+        Parameters:
+            id_column (str): Column identifying each record.
+            name_column (str): Column holding the name to compare.
+            blocking_columns (list, optional): Columns whose normalized values must match exactly.
+            date_columns (list, optional): Blocking columns to compare as dates, whatever their format.
+            threshold (float): Minimum name similarity (0 to 1) for two records to be duplicates.
+            max_block_size (int): Blocks larger than this (e.g. a very common name token) are skipped.
+
+        Returns:
+            pd.DataFrame: Merge map with one row per duplicate record: its id and the id of the
+                          record it duplicates (the first one in the DataFrame), in columns
+                          `id_column` and 'Canonical' + `id_column`.
+
+        Raises:
+            ValueError: If a specified column is not found in the DataFrame.
+        """
+        blocking_columns = blocking_columns or []
+        date_columns = date_columns or []
+        for column in [id_column, name_column] + blocking_columns + date_columns:
+            if column not in self.df.columns:
+                raise ValueError(f"Column name '{column}' not found in the DataFrame.")
+
+        # Normalize names: lowercase, no punctuation, words in sorted order
+        tokens = (self.df[name_column].fillna('').astype(str).str.lower()
+                  .str.replace(r'[^\w\s]', ' ', regex=True).str.split())
+        names = tokens.apply(lambda words: ' '.join(sorted(words))).to_numpy()
+
+        # Blocking key for every (record, name token): the token plus the normalized blocking values
+        block_values = pd.Series('', index=self.df.index)
+        for column in blocking_columns:
+            if column in date_columns:
+                values = pd.to_datetime(self.df[column], format='mixed', errors='coerce').dt.strftime('%Y-%m-%d')
+            else:
+                values = self.df[column].astype(str).str.lower().str.strip()
+            block_values = block_values + '|' + values.fillna('')
+        keys = pd.DataFrame({'row': range(len(self.df)), 'token': tokens.to_numpy(), 'block': block_values.to_numpy()})
+        keys = keys.explode('token').dropna(subset=['token'])
+        keys = pd.DataFrame({'row': keys['row'], 'key': keys['token'] + keys['block']}).drop_duplicates()
+        block_sizes = keys.groupby('key')['row'].transform('size')
+        keys = keys[(block_sizes > 1) & (block_sizes <= max_block_size)]
+
+        # Candidate pairs share at least one block; score only those
+        pairs = keys.merge(keys, on='key')
+        pairs = pairs[pairs['row_x'] < pairs['row_y']][['row_x', 'row_y']].drop_duplicates()
+
+        # Union-find over the matching pairs, the earliest record of each group being its root
+        roots = list(range(len(self.df)))
+        def find(row):
+            while roots[row] != row:
+                roots[row] = roots[roots[row]]
+                row = roots[row]
+            return row
+        def similar(name_x, name_y):
+            if name_x == name_y:
+                return True
+            matcher = difflib.SequenceMatcher(None, name_x, name_y)
+            # The quick ratios are cheap upper bounds of ratio(), ruling out most non-matches early
+            return (matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold
+                    and matcher.ratio() >= threshold)
+        for row_x, row_y in zip(pairs['row_x'], pairs['row_y']):
+            if similar(names[row_x], names[row_y]):
+                root_x, root_y = find(row_x), find(row_y)
+                roots[max(root_x, root_y)] = min(root_x, root_y)
+
+        ids = self.df[id_column].to_numpy()
+        duplicates = [(ids[row], ids[find(row)]) for row in range(len(self.df)) if find(row) != row]
+        return pd.DataFrame(duplicates, columns=[id_column, 'Canonical' + id_column])
         
         # ADDED FUNCTION
     def format_column_strings_only_trim(self, column: str) -> pd.DataFrame:
@@ -249,7 +454,7 @@ class DataScrubber:
             pd.DataFrame: Updated DataFrame with missing data handled.
         """
         if drop:
-            self.df = self.df.dropna()
+            self._keep_rows(self.df.notna().all(axis=1), 'missing_values')
         elif fill_value is not None:
             self.df = self.df.fillna(fill_value)
         return self.df
@@ -289,16 +494,27 @@ class DataScrubber:
         except KeyError:
             raise ValueError(f"Column name '{column}' not found in the DataFrame.")
 
-    def remove_duplicate_records(self) -> pd.DataFrame:
+    def remove_duplicate_records(self, ignore_columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Remove duplicate rows from the DataFrame.
+
+        Parameters:
+            ignore_columns (list, optional): Columns not compared, e.g. the SourceFile column, so the
+                                             same row delivered in two files is still a duplicate.
         
         Returns:
             pd.DataFrame: Updated DataFrame with duplicates removed.
 
-        """
-        self.df = self.df.drop_duplicates()
-        return self.df
+        Raises:
+            ValueError: If an ignored column is not found in the DataFrame.
+        """
+        subset = None
+        if ignore_columns:
+            for column in ignore_columns:
+                if column not in self.df.columns:
+                    raise ValueError(f"Column name '{column}' not found in the DataFrame.")
+            subset = [column for column in self.df.columns if column not in ignore_columns]
+        return self._keep_rows(~self.df.duplicated(subset=subset), 'duplicate')
 
     def rename_columns(self, column_mapping: Dict[str, str]) -> pd.DataFrame:
         """
@@ -7,38 +7,54 @@ unique files for the assignment, which requires one file per table. Otherwise, t
 would have been included in the main script.
 """
 
+from typing import Optional, Tuple
+
 import data_prep as dp
+import pandas as pd
+from cleaning_specs import CUSTOMERS_SPEC
 from data_scrubber import DataScrubber
+from reject_sink import RejectSink
+from utils.logger import logger
 
-def main() -> None:
-    """Main function for pre-processing customer data."""
+def main(reject_sink: Optional[RejectSink] = None, save: bool = True,
+         raw_pattern: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Main function for pre-processing customer data.
 
+    Returns the prepared DataFrame and the merge map of likely near-duplicate customers
+    (saved as customers_merge_map.csv), for review.
+    """
 
-    df_customers = dp.read_raw_data("customers_data.csv")
 
-    df_customers.columns = df_customers.columns.str.strip()  # Clean column names
-    df_customers = df_customers.drop_duplicates()            # Remove duplicates
+    # Every raw customers file (default: dp.RAW_FILE_PATTERNS), with clean column names
+    df_customers = dp.read_raw_files(raw_pattern or dp.RAW_FILE_PATTERNS["customers"])
+    scrubber_customers = DataScrubber(df_customers, reject_sink, "customers")
+    scrubber_customers.remove_duplicate_records(ignore_columns=[dp.SOURCE_FILE_COLUMN])  # Remove duplicates, even across files
 
-    df_customers['Name'] = df_customers['Name'].str.strip()  # Trim whitespace from column values
-    df_customers = df_customers.dropna(subset=['CustomerID', 'Name'])  # Drop rows missing critical info
-    
-    scrubber_customers = DataScrubber(df_customers)
     scrubber_customers.check_data_consistency_before_cleaning()
     scrubber_customers.inspect_data()
 
-    df_customers = scrubber_customers.handle_missing_data(fill_value="N/A")
-    df_customers = scrubber_customers.parse_dates_to_add_standard_datetime('JoinDate')
+    # Trim names, drop rows missing critical info or with a birthday outside of a
+    # reasonable range, add StandardJoinDate and fill missing values (see cleaning_specs.py)
+    df_customers = scrubber_customers.apply_cleaning_spec(CUSTOMERS_SPEC)
     
     # ADDED CHECKS
 
-    # Remove customers with birthday outside of a reasonable range
-    df_customers = scrubber_customers.filter_date_column_outliers('Birthday', '1900-01-01', '2025-12-31')
+    # Flag customers that are probably entered twice (e.g. a typo in the name), for review
+    df_merge_map = scrubber_customers.find_near_duplicate_records(
+        'CustomerID', 'Name', blocking_columns=['Region', 'Birthday'], date_columns=['Birthday'])
+    if not df_merge_map.empty:
+        logger.warning(f"{len(df_merge_map)} customers look like near-duplicates of another customer")
 
     # END ADDED CHECKS
     
+    df_customers = scrubber_customers.drop_columns([dp.SOURCE_FILE_COLUMN])  # Only rejected rows keep their source file
     scrubber_customers.check_data_consistency_after_cleaning()
 
-    dp.save_prepared_data(df_customers, "customers_data_prepared.csv")
+    if save:
+        dp.save_prepared_data(df_customers, "customers_data_prepared.csv")
+        dp.save_prepared_data(df_merge_map, "customers_merge_map.csv")
+    return df_customers, df_merge_map
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,27 +7,37 @@ this script is designed to handle generic datasets
 only doing the basic cleaning and preparation steps.
 """
 
+from typing import Optional
+
 import data_prep as dp
 import pandas as pd
+from cleaning_specs import GENERIC_SPEC
 from data_scrubber import DataScrubber
+from reject_sink import RejectSink
 
-def main(csv_name_without_extension: str) -> None:
-    """Main function for pre-processing sales data."""
+def main(csv_name_without_extension: str, reject_sink: Optional[RejectSink] = None, save: bool = True,
+         raw_pattern: Optional[str] = None) -> pd.DataFrame:
+    """
+    Main function for pre-processing a generic table. Returns the prepared DataFrame.
 
-    df = dp.read_raw_data(csv_name_without_extension+'.csv')
+    Reads every raw file matching raw_pattern (default: csv_name_without_extension followed by *.csv).
+    """
 
-    df.columns = df.columns.str.strip()  # Clean column names
-    df = df.drop_duplicates()            # Remove duplicates
+    df = dp.read_raw_files(raw_pattern or csv_name_without_extension + '*.csv')  # With clean column names
+    scrubber_sales = DataScrubber(df, reject_sink, csv_name_without_extension.removesuffix('_data'))
+    df = scrubber_sales.remove_duplicate_records(ignore_columns=[dp.SOURCE_FILE_COLUMN])  # Remove duplicates, even across files
     
-    scrubber_sales = DataScrubber(df)
     scrubber_sales.check_data_consistency_before_cleaning()
     scrubber_sales.inspect_data()
     
-    df = scrubber_sales.handle_missing_data(fill_value="N/A")
+    df = scrubber_sales.apply_cleaning_spec(GENERIC_SPEC)  # Fill missing values
 
+    df = scrubber_sales.drop_columns([dp.SOURCE_FILE_COLUMN])  # Only rejected rows keep their source file
     scrubber_sales.check_data_consistency_after_cleaning()
 
-    dp.save_prepared_data(df, csv_name_without_extension +"_prepared.csv")
+    if save:
+        dp.save_prepared_data(df, csv_name_without_extension +"_prepared.csv")
+    return df
 
 if __name__ == "__main__":
     main()
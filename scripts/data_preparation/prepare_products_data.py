@@ -7,29 +7,35 @@ unique files for the assignment, which requires one file per table. Otherwise, t
 would have been included in the main script.
 """
 
+from typing import Optional
+
 import data_prep as dp
+import pandas as pd
+from cleaning_specs import PRODUCTS_SPEC
 from data_scrubber import DataScrubber
+from reject_sink import RejectSink
 
-def main() -> None:
-    """Main function for pre-processing product data."""
-
+def main(reject_sink: Optional[RejectSink] = None, save: bool = True,
+         raw_pattern: Optional[str] = None) -> pd.DataFrame:
+    """Main function for pre-processing product data. Returns the prepared DataFrame."""
 
-    df_products = dp.read_raw_data("products_data.csv")
 
-    df_products.columns = df_products.columns.str.strip()  # Clean column names
-    df_products = df_products.drop_duplicates()            # Remove duplicates
+    # Every raw products file (default: dp.RAW_FILE_PATTERNS), with clean column names
+    df_products = dp.read_raw_files(raw_pattern or dp.RAW_FILE_PATTERNS["products"])
+    scrubber_products = DataScrubber(df_products, reject_sink, "products")
+    scrubber_products.remove_duplicate_records(ignore_columns=[dp.SOURCE_FILE_COLUMN])  # Remove duplicates, even across files
 
-    df_products['ProductName'] = df_products['ProductName'].str.strip()  # Trim whitespace from column values
-    df_products = df_products.dropna(subset=['ProductID', 'ProductName'])  # Drop rows missing critical info
-    
-    scrubber_products = DataScrubber(df_products)
     scrubber_products.check_data_consistency_before_cleaning()
     scrubber_products.inspect_data()
-    
-    df_products = scrubber_products.handle_missing_data(fill_value="N/A")
+
+    # Trim product names, drop rows missing critical info and fill missing values (see cleaning_specs.py)
+    df_products = scrubber_products.apply_cleaning_spec(PRODUCTS_SPEC)
+    df_products = scrubber_products.drop_columns([dp.SOURCE_FILE_COLUMN])  # Only rejected rows keep their source file
     scrubber_products.check_data_consistency_after_cleaning()
 
-    dp.save_prepared_data(df_products, "products_data_prepared.csv")
+    if save:
+        dp.save_prepared_data(df_products, "products_data_prepared.csv")
+    return df_products
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,33 +7,35 @@ unique files for the assignment, which requires one file per table. Otherwise, t
 would have been included in the main script.
 """
 
+from typing import Optional
+
 import data_prep as dp
 import pandas as pd
+from cleaning_specs import SALES_SPEC
 from data_scrubber import DataScrubber
+from reject_sink import RejectSink
 
-def main() -> None:
-    """Main function for pre-processing sales data."""
-
-    df_sales = dp.read_raw_data("sales_data.csv")
+def main(reject_sink: Optional[RejectSink] = None, save: bool = True,
+         raw_pattern: Optional[str] = None) -> pd.DataFrame:
+    """Main function for pre-processing sales data. Returns the prepared DataFrame."""
 
-    df_sales.columns = df_sales.columns.str.strip()  # Clean column names
-    df_sales = df_sales.drop_duplicates()            # Remove duplicates
+    # Every raw sales file (default: dp.RAW_FILE_PATTERNS), with clean column names
+    df_sales = dp.read_raw_files(raw_pattern or dp.RAW_FILE_PATTERNS["sales"])
+    scrubber_sales = DataScrubber(df_sales, reject_sink, "sales")
+    scrubber_sales.remove_duplicate_records(ignore_columns=[dp.SOURCE_FILE_COLUMN])  # Remove duplicates, even across files
 
-    df_sales['SaleDate'] = pd.to_datetime(df_sales['SaleDate'], errors='coerce')  # Ensure sale_date is datetime
-    df_sales = df_sales.dropna(subset=['CustomerID', 'TransactionID', 'ProductID', 'SaleDate'])  # Drop rows missing critical info
-    
-    scrubber_sales = DataScrubber(df_sales)
     scrubber_sales.check_data_consistency_before_cleaning()
     scrubber_sales.inspect_data()
-    
-    df_sales = scrubber_sales.handle_missing_data(fill_value="N/A")
 
-    # ADDED CHECKS
-    df_sales = scrubber_sales.add_state_code_column('State')
+    # Parse SaleDate, drop rows missing critical info, add StateCode and fill missing values (see cleaning_specs.py)
+    df_sales = scrubber_sales.apply_cleaning_spec(SALES_SPEC)
 
+    df_sales = scrubber_sales.drop_columns([dp.SOURCE_FILE_COLUMN])  # Only rejected rows keep their source file
     scrubber_sales.check_data_consistency_after_cleaning()
 
-    dp.save_prepared_data(df_sales, "sales_data_prepared.csv")
+    if save:
+        dp.save_prepared_data(df_sales, "sales_data_prepared.csv")
+    return df_sales
 
 if __name__ == "__main__":
     main()
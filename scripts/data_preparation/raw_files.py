@@ -0,0 +1,83 @@
+"""
+Raw Files
+File: scripts/data_preparation/raw_files.py
+
+Reads many raw CSV files of one table concurrently, e.g. the daily sales files every
+store delivers. Reading a file waits on the disk, so files are read on a pool of
+threads; parsing a CSV keeps a CPU core busy, so the file contents are parsed on a pool
+of processes. Each file is handed to the parsers as soon as it has been read. The parser
+processes are spawned rather than forked: the caller already runs threads (the readers,
+the reject sink's writer, loguru's locks), and forking a process with threads running can
+leave a lock held forever in the child.
+
+Every parsed row is tagged with the file it came from (in the SourceFile column), so
+rejected rows can be traced back to their delivery. Frames are yielded in the order of
+the files, as soon as each one (and every file before it) is parsed. An empty file (a
+delivery that was created but never written) gives a frame with no columns at all, for
+the caller to skip.
+
+Usage:
+
+    for df in iter_csv_files([(path, path.name) for path in sorted(RAW_DATA_DIR.glob("sales_data*.csv"))]):
+        ...
+"""
+
+import multiprocessing
+import os
+import pathlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+SOURCE_FILE_COLUMN = "SourceFile"
+DEFAULT_IO_WORKERS = 8
+
+def parse_csv(data: bytes, source_file: str) -> pd.DataFrame:
+    """
+    Parse the contents of a CSV file, with trimmed column names and a SourceFile column.
+    An empty file (no header row) gives an empty DataFrame with no columns.
+    """
+    try:
+        df = pd.read_csv(BytesIO(data))
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    df.columns = df.columns.str.strip()
+    df[SOURCE_FILE_COLUMN] = source_file
+    return df
+
+def iter_csv_files(files: List[Tuple[pathlib.Path, str]], io_workers: int = DEFAULT_IO_WORKERS,
+                   parse_workers: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read and parse CSV files concurrently, yielding one DataFrame per file, in file order.
+
+    Parameters:
+        files (list): (path, source file name) of every file to read; the name goes in the SourceFile column.
+        io_workers (int): Number of threads reading files.
+        parse_workers (int, optional): Number of processes parsing files. Defaults to the number of
+                                       CPU cores. With a single file or worker, files are parsed in
+                                       the calling thread instead (while the next files are read),
+                                       saving the cost of starting processes.
+
+    Returns:
+        Iterator[pd.DataFrame]: The parsed files, each with a SourceFile column (empty files
+                                without any column).
+    """
+    if not files:
+        return
+    parse_workers = min(parse_workers or os.cpu_count() or 1, len(files))
+    with ThreadPoolExecutor(max_workers=min(io_workers, len(files)), thread_name_prefix="raw-file-reader") as readers:
+        if parse_workers == 1:
+            reading = [readers.submit(path.read_bytes) for path, _ in files]
+            for future, (_, name) in zip(reading, files):
+                yield parse_csv(future.result(), name)
+            return
+
+        with ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")) as parsers:
+            def read_then_parse(path: pathlib.Path, name: str) -> Future:
+                return parsers.submit(parse_csv, path.read_bytes(), name)
+
+            parsing = [readers.submit(read_then_parse, path, name) for path, name in files]
+            for future in parsing:
+                yield future.result().result()
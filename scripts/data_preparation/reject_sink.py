@@ -0,0 +1,182 @@
+"""
+Reject Sink
+File: scripts/data_preparation/reject_sink.py
+
+Records every row dropped during data preparation, together with a reason code,
+so we keep an audit trail of what the cleaning steps threw away.
+
+Rows are handed over in whole DataFrame batches (never one at a time) and a
+background thread converts them to Arrow and writes them to one columnar Parquet file
+per table, so the prep code only pays for queueing the batch. The queue between the
+prep code and the writer thread is bounded, so if the writer falls behind, the prep
+code waits instead of holding an ever-growing backlog in memory.
+
+Usage:
+
+    with RejectSink(REJECTS_DATA_DIR) as sink:
+        scrubber = DataScrubber(df, reject_sink=sink, table_name="customers")
+        ...
+
+The rows dropped from a table are written to <table>.parquet, with the table's own
+columns followed by:
+    reason (str), source_index (str, the row's index label), rejected_at (timestamp).
+If rows of one table are dropped with different columns or column types (e.g. before
+and after a type conversion), each further layout goes to its own <table>_<n>.parquet.
+"""
+
+import datetime
+import pathlib
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Columns added after the table's own columns
+REJECT_COLUMNS = [
+    ("reason", pa.string()),
+    ("source_index", pa.string()),
+    ("rejected_at", pa.timestamp("us")),
+]
+
+# Sentinel placed on the queue to tell the writer thread to finish up
+_STOP = object()
+
+
+class RejectSink:
+    def __init__(self, directory: pathlib.Path, max_pending_batches: int = 64, row_group_size: int = 50_000):
+        """
+        Initialize the RejectSink and start its background writer thread.
+
+        Parameters:
+            directory (pathlib.Path): Folder the Parquet file of each table is written to (existing files are overwritten).
+            max_pending_batches (int): Maximum number of batches waiting in the queue before `put` blocks.
+            row_group_size (int): Number of buffered rows that triggers a write to the file.
+        """
+        self.directory = pathlib.Path(directory)
+        self.file_paths: List[pathlib.Path] = []
+        self.row_group_size = row_group_size
+        self.rejected_count = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending_batches)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="reject-sink-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "RejectSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def put(self, rejected: pd.DataFrame, reason: Union[str, pd.Series], table: str,
+            mask: Optional[np.ndarray] = None) -> None:
+        """
+        Queue a batch of rejected rows for writing.
+
+        Parameters:
+            rejected (pd.DataFrame): The rows that were dropped.
+            reason (str or pd.Series): Short reason code, e.g. 'duplicate' or 'value_out_of_range',
+                                       or a Series giving each dropped row's reason code, in order.
+            table (str): Name of the table the rows were dropped from.
+            mask (np.ndarray, optional): Boolean array selecting the dropped rows of `rejected`, so the
+                                         rows are picked out by the writer thread rather than the caller.
+
+        Raises:
+            RuntimeError: If the sink is closed or the writer thread has failed.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot write to a closed RejectSink.")
+        if self._error is not None:
+            raise RuntimeError(f"RejectSink writer failed: {self._error}")
+        rejected_rows = len(rejected) if mask is None else int(mask.sum())
+        if rejected_rows == 0:
+            return
+
+        # The rows are picked out and converted by the writer thread, off the caller's path. A
+        # shallow copy is enough to keep later changes to the caller's DataFrame out of the batch.
+        self.rejected_count += rejected_rows
+        self._queue.put((rejected.copy(deep=False), mask, reason, table, datetime.datetime.now()))
+
+    def close(self) -> None:
+        """
+        Flush any queued rows, stop the writer thread and close the file.
+
+        Raises:
+            RuntimeError: If the writer thread failed while writing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"RejectSink writer failed: {self._error}")
+
+    @staticmethod
+    def _to_table(rejected: pd.DataFrame, mask: Optional[np.ndarray], reason: Union[str, pd.Series],
+                  rejected_at: datetime.datetime) -> pa.Table:
+        """Convert a batch of rejected rows (those selected by mask, if given) to an Arrow table, with the REJECT_COLUMNS."""
+        if mask is not None:
+            rejected = rejected[mask]
+        columns = []
+        for name in rejected.columns:
+            try:
+                columns.append(pa.array(rejected[name], from_pandas=True))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed types in an object column (e.g. numbers and text in one raw column): keep them as text
+                columns.append(pa.array(rejected[name].astype(str).where(rejected[name].notna()), pa.string(), from_pandas=True))
+        row_count = len(rejected)
+        reasons = pa.array(reason, from_pandas=True).cast(pa.string()) if isinstance(reason, pd.Series) else pa.repeat(pa.scalar(reason, pa.string()), row_count)
+        columns += [
+            reasons,
+            pa.array(rejected.index, from_pandas=True).cast(pa.string()) if row_count else pa.array([], pa.string()),
+            pa.repeat(pa.scalar(rejected_at, pa.timestamp("us")), row_count),
+        ]
+        return pa.Table.from_arrays(columns, names=[str(name) for name in rejected.columns] + [name for name, _ in REJECT_COLUMNS])
+
+    def _open_writer(self, table: str, schema: pa.Schema, layouts: int) -> pq.ParquetWriter:
+        """Open the Parquet file for a table's rejected rows in one more layout, the first being <table>.parquet."""
+        file_path = self.directory.joinpath(f"{table}.parquet" if layouts == 0 else f"{table}_{layouts + 1}.parquet")
+        self.file_paths.append(file_path)
+        return pq.ParquetWriter(file_path, schema)
+
+    def _run(self) -> None:
+        """Writer thread loop: buffer each table's rows and write them out as row groups of its file."""
+        # (table, schema) -> [writer, pending tables, pending row count]
+        outputs: Dict[Tuple[str, pa.Schema], list] = {}
+        layouts: Dict[str, int] = {}
+        stopped = False
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    stopped = True
+                    break
+                rejected, mask, reason, table, rejected_at = item
+                batch = self._to_table(rejected, mask, reason, rejected_at)
+                key = (table, batch.schema)
+                if key not in outputs:
+                    outputs[key] = [self._open_writer(table, batch.schema, layouts.get(table, 0)), [], 0]
+                    layouts[table] = layouts.get(table, 0) + 1
+                output = outputs[key]
+                output[1].append(batch)
+                output[2] += batch.num_rows
+                if output[2] >= self.row_group_size:
+                    output[0].write_table(pa.concat_tables(output[1]))
+                    output[1], output[2] = [], 0
+            for writer, pending, _ in outputs.values():
+                if pending:
+                    writer.write_table(pa.concat_tables(pending))
+        except BaseException as e:
+            self._error = e
+            # Keep draining so producers blocked on a full queue are released
+            while not stopped:
+                stopped = self._queue.get() is _STOP
+        finally:
+            for writer, _, _ in outputs.values():
+                writer.close()
@@ -0,0 +1,267 @@
+"""
+Data Warehouse Maintenance - Customer Referral Trees
+File: scripts/data_warehouse/customer_referrals.py
+
+Maintains two tables built from the customers.ReferringCustomer self-reference:
+
+- customer_referrals: closure table with one row per (AncestorID, DescendantID) pair,
+  including each customer as its own ancestor at Depth 0. Everyone downstream of a
+  customer is a single indexed lookup, however deep the referral chain goes.
+- referral_sales: per customer, the number of customers downstream of them and the
+  total sales those downstream customers made.
+
+A referral that would close a loop (A referred by B, B referred by A) is left out of
+the closure table and logged as a warning, so every customer belongs to a tree. Such
+customers are kept in referral_cuts, and every incremental load tries to re-attach
+them, as the referral may no longer close a loop.
+"""
+
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from utils.logger import logger
+
+def create_referral_schema(cursor: sqlite3.Cursor) -> None:
+    """Create the referral closure and referral sales tables if they don't exist."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_referrals (
+            AncestorID INTEGER,
+            DescendantID INTEGER,
+            Depth INTEGER,
+            PRIMARY KEY (AncestorID, DescendantID)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_referrals_descendant ON customer_referrals (DescendantID)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS referral_sales (
+            CustomerID INTEGER PRIMARY KEY,
+            DownstreamCustomers INTEGER,
+            DownstreamSales REAL
+        )
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS referral_cuts (CustomerID INTEGER PRIMARY KEY)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_customerid ON sales (CustomerID)")
+
+def _referring_customer(value) -> Optional[int]:
+    """Return the referring customer as an int, or None if there isn't one."""
+    return None if pd.isna(value) else int(value)
+
+def _ancestor_chains(parents: Dict[int, Optional[int]]) -> Tuple[Dict[int, List[int]], Set[int]]:
+    """
+    Return, for every customer in parents, its ancestors ordered from nearest to furthest,
+    and the customers whose referral was cut.
+
+    Referrals that close a loop are cut (and logged), making that customer a root.
+    """
+    chains: Dict[int, List[int]] = {}
+    cut: Set[int] = set()
+    for start in parents:
+        path: List[int] = []
+        on_path: Set[int] = set()
+        node = start
+        while node is not None and node not in chains:
+            if node in on_path:
+                logger.warning(f"Referral loop through customer {path[-1]}: ignoring its ReferringCustomer {node}")
+                cut.add(path[-1])
+                node = None
+                break
+            path.append(node)
+            on_path.add(node)
+            node = parents.get(node)
+
+        # Walk back down the path, each customer's chain being its parent plus the parent's chain
+        chain = [] if node is None else [node] + chains[node]
+        for customer in reversed(path):
+            chains[customer] = chain
+            chain = [customer] + chain
+    return chains, cut
+
+def _refresh_referral_sales(cursor: sqlite3.Cursor, customer_ids: Optional[Set[int]] = None) -> None:
+    """
+    Recompute referral_sales from scratch for the given customers (all customers if None).
+
+    For all customers, every customer's sales total is computed in one pass over sales. For a few,
+    only their descendants' sales are summed, looked up through idx_sales_customerid.
+    """
+    if customer_ids is None:
+        cursor.execute("""
+            INSERT OR REPLACE INTO referral_sales (CustomerID, DownstreamCustomers, DownstreamSales)
+            SELECT r.AncestorID,
+                   SUM(r.Depth > 0),
+                   COALESCE(SUM(CASE WHEN r.Depth > 0 THEN t.Total END), 0)
+            FROM customer_referrals AS r
+            LEFT JOIN (SELECT CustomerID, SUM(SaleAmount) AS Total FROM sales GROUP BY CustomerID) AS t
+                ON t.CustomerID = r.DescendantID
+            GROUP BY r.AncestorID
+        """)
+        return
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS refresh_ids (CustomerID INTEGER PRIMARY KEY)")
+    cursor.execute("DELETE FROM refresh_ids")
+    cursor.executemany("INSERT INTO refresh_ids VALUES (?)", [(c,) for c in customer_ids])
+    cursor.execute("""
+        INSERT OR REPLACE INTO referral_sales (CustomerID, DownstreamCustomers, DownstreamSales)
+        SELECT r.AncestorID,
+               SUM(r.Depth > 0),
+               COALESCE(SUM(CASE WHEN r.Depth > 0
+                                 THEN (SELECT SUM(SaleAmount) FROM sales WHERE CustomerID = r.DescendantID) END), 0)
+        FROM refresh_ids AS i
+        JOIN customer_referrals AS r ON r.AncestorID = i.CustomerID
+        GROUP BY r.AncestorID
+    """)
+    cursor.execute("DROP TABLE refresh_ids")
+
+def rebuild_customer_referrals(cursor: sqlite3.Cursor) -> None:
+    """Rebuild customer_referrals and referral_sales from the customers and sales tables."""
+    customers = cursor.execute("SELECT CustomerID, ReferringCustomer FROM customers").fetchall()
+    parents = {int(customer_id): _referring_customer(referrer) for customer_id, referrer in customers}
+    for referrer in set(parents.values()) - set(parents) - {None}:
+        parents[referrer] = None  # Referred by someone not (yet) in the customers table
+
+    chains, cut = _ancestor_chains(parents)
+    rows = []
+    for customer, ancestors in chains.items():
+        rows.append((customer, customer, 0))
+        rows.extend((ancestor, customer, depth) for depth, ancestor in enumerate(ancestors, start=1))
+
+    cursor.execute("DELETE FROM customer_referrals")
+    cursor.execute("DELETE FROM referral_sales")
+    cursor.execute("DELETE FROM referral_cuts")
+    cursor.executemany("INSERT INTO customer_referrals VALUES (?, ?, ?)", rows)
+    cursor.executemany("INSERT INTO referral_cuts VALUES (?)", [(c,) for c in cut])
+    _refresh_referral_sales(cursor)
+
+def _move_subtree(cursor: sqlite3.Cursor, customer_id: int, new_parent: Optional[int]) -> Set[int]:
+    """
+    Move a customer, and everyone downstream of them, under new_parent in the closure table.
+
+    Returns the customers whose referral_sales need recomputing: the old and new ancestors.
+    """
+    # Detach the subtree from its old ancestors...
+    affected = {a for (a,) in cursor.execute(
+        "SELECT AncestorID FROM customer_referrals WHERE DescendantID = ?", (customer_id,))}
+    cursor.execute("""
+        DELETE FROM customer_referrals
+        WHERE DescendantID IN (SELECT DescendantID FROM customer_referrals WHERE AncestorID = :c)
+          AND AncestorID NOT IN (SELECT DescendantID FROM customer_referrals WHERE AncestorID = :c)
+    """, {"c": customer_id})
+
+    # ...and attach it under the new parent's ancestors
+    if new_parent is not None:
+        cursor.execute("""
+            INSERT INTO customer_referrals (AncestorID, DescendantID, Depth)
+            SELECT a.AncestorID, s.DescendantID, a.Depth + s.Depth + 1
+            FROM customer_referrals AS a, customer_referrals AS s
+            WHERE a.DescendantID = ? AND s.AncestorID = ?
+        """, (new_parent, customer_id))
+        affected |= {a for (a,) in cursor.execute(
+            "SELECT AncestorID FROM customer_referrals WHERE DescendantID = ?", (new_parent,))}
+    return affected
+
+def update_customer_referrals(cursor: sqlite3.Cursor, customers_df: pd.DataFrame) -> None:
+    """
+    Bring the referral tables up to date after customers_df was loaded incrementally.
+
+    Only customers that are new or whose ReferringCustomer changed are moved in the closure
+    table (along with everyone downstream of them), together with the customers in
+    referral_cuts, whose referral may no longer close a loop. Only the referral_sales rows
+    of their old and new ancestors are recomputed. Referrers that are not customers and
+    that nobody references any more are removed.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor on the data warehouse.
+        customers_df (pd.DataFrame): The customers rows that were just loaded.
+    """
+    # Every customer (and referrer) is its own ancestor at depth 0
+    ids = {int(c) for c in customers_df["CustomerID"]}
+    ids |= {r for r in map(_referring_customer, customers_df["ReferringCustomer"]) if r is not None}
+    cursor.executemany("INSERT OR IGNORE INTO customer_referrals VALUES (?, ?, 0)", [(c, c) for c in ids])
+    cursor.executemany("INSERT OR IGNORE INTO referral_sales VALUES (?, 0, 0)", [(c,) for c in ids])
+
+    cut = {c for (c,) in cursor.execute("SELECT CustomerID FROM referral_cuts")}
+    candidates = sorted({int(c) for c in customers_df["CustomerID"]} | cut)
+
+    # A cut customer may become attachable once another one moved, so passes repeat until
+    # one moves nobody. Every move either puts a customer under its ReferringCustomer for
+    # good or makes a cut customer a root, so this ends.
+    affected: Set[int] = set()
+    old_parents: Set[int] = set()
+    moved = True
+    while moved:
+        moved = False
+        for customer_id in candidates:
+            row = cursor.execute("SELECT ReferringCustomer FROM customers WHERE CustomerID = ?", (customer_id,)).fetchone()
+            new_parent = _referring_customer(row[0]) if row else None
+            row = cursor.execute(
+                "SELECT AncestorID FROM customer_referrals WHERE DescendantID = ? AND Depth = 1", (customer_id,)
+            ).fetchone()
+            old_parent = row[0] if row else None
+            if new_parent == old_parent:
+                cut.discard(customer_id)
+                continue
+
+            subtree = {d for (d,) in cursor.execute(
+                "SELECT DescendantID FROM customer_referrals WHERE AncestorID = ?", (customer_id,))}
+            if new_parent in subtree:
+                if customer_id not in cut:
+                    logger.warning(f"Referral loop through customer {customer_id}: ignoring its ReferringCustomer {new_parent}")
+                    cut.add(customer_id)
+                new_parent = None
+                if old_parent is None:
+                    continue
+            else:
+                cut.discard(customer_id)
+
+            affected |= _move_subtree(cursor, customer_id, new_parent)
+            if old_parent is not None:
+                old_parents.add(old_parent)
+            moved = True
+
+    cursor.execute("DELETE FROM referral_cuts")
+    cursor.executemany("INSERT INTO referral_cuts VALUES (?)", [(c,) for c in cut])
+
+    # Referrers outside the customers table are kept only while someone references them;
+    # such a referrer has no referrer of its own, so its referrals are never cut as loops
+    unreferenced = [c for c in old_parents if not cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM customers WHERE CustomerID = :c)
+            OR EXISTS (SELECT 1 FROM customer_referrals WHERE AncestorID = :c AND Depth = 1)
+    """, {"c": c}).fetchone()[0]]
+    cursor.executemany("DELETE FROM customer_referrals WHERE DescendantID = ?", [(c,) for c in unreferenced])
+    cursor.executemany("DELETE FROM referral_sales WHERE CustomerID = ?", [(c,) for c in unreferenced])
+    affected -= set(unreferenced)
+
+    if affected:
+        _refresh_referral_sales(cursor, affected)
+
+def apply_sales_changes(cursor: sqlite3.Cursor, sales_changes: pd.DataFrame) -> None:
+    """
+    Add the signed sales changes of a load to the DownstreamSales of every referring ancestor.
+
+    Must run before update_customer_referrals, which recomputes (rather than adjusts)
+    the customers whose referral trees changed.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor on the data warehouse.
+        sales_changes (pd.DataFrame): Signed sales changes, see etl_to_dw.signed_sales_changes.
+    """
+    totals = sales_changes.groupby("CustomerID")["SaleAmount"].sum()
+    if totals.empty:
+        return
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS customer_sales_changes (CustomerID INTEGER PRIMARY KEY, Amount REAL)")
+    cursor.execute("DELETE FROM customer_sales_changes")
+    cursor.executemany("INSERT INTO customer_sales_changes VALUES (?, ?)",
+                       [(int(c), float(a)) for c, a in totals.items()])
+    cursor.execute("""
+        UPDATE referral_sales
+        SET DownstreamSales = DownstreamSales + d.Amount
+        FROM (
+            SELECT r.AncestorID, SUM(c.Amount) AS Amount
+            FROM customer_sales_changes AS c
+            JOIN customer_referrals AS r ON r.DescendantID = c.CustomerID AND r.Depth > 0
+            GROUP BY r.AncestorID
+        ) AS d
+        WHERE referral_sales.CustomerID = d.AncestorID
+    """)
+    cursor.execute("DROP TABLE customer_sales_changes")
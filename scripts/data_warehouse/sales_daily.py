@@ -0,0 +1,102 @@
+"""
+Data Warehouse Maintenance - Daily Sales Time Series
+File: scripts/data_warehouse/sales_daily.py
+
+Maintains the `sales_daily` table: revenue per day for every store, state and
+campaign, along with 7-day and 28-day moving averages of that daily revenue.
+
+Trend charts read this small table instead of aggregating the whole `sales`
+table every time. Each load only re-aggregates the sale dates it touched and
+only recomputes the moving averages that can see those dates (each touched date
+and the 27 days after it).
+
+Moving averages are calendar based: days without sales count as zero revenue.
+Rows only exist for days on which the group had sales.
+"""
+
+import sqlite3
+from typing import Iterable
+
+# Group type -> SQL expression (over the sales and states tables) for the group key
+SALES_DAILY_GROUPS = {
+    "store": "CAST(s.StoreID AS TEXT)",
+    "state": "st.StateCode",
+    "campaign": "CAST(s.CampaignID AS TEXT)",
+}
+
+def create_sales_daily_schema(cursor: sqlite3.Cursor) -> None:
+    """Create the sales_daily table (and the sales index it relies on) if they don't exist."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            GroupType TEXT,
+            GroupKey TEXT,
+            SaleDate TEXT,
+            Revenue REAL,
+            TransactionCount INTEGER,
+            Revenue7DayAvg REAL,
+            Revenue28DayAvg REAL,
+            PRIMARY KEY (GroupType, GroupKey, SaleDate)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_saledate ON sales (SaleDate)")
+
+def update_sales_daily(cursor: sqlite3.Cursor, sale_dates: Iterable[str]) -> None:
+    """
+    Rebuild the sales_daily rows for the given sale dates and refresh the affected moving averages.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor on the data warehouse.
+        sale_dates (iterable): ISO-8601 dates (YYYY-MM-DD) whose sales were inserted, changed or removed.
+    """
+    sale_dates = sorted(set(sale_dates))
+    if not sale_dates:
+        return
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS touched_dates (SaleDate TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM touched_dates")
+    cursor.executemany("INSERT INTO touched_dates VALUES (?)", [(d,) for d in sale_dates])
+
+    # Re-aggregate the touched days from the sales table
+    cursor.execute("DELETE FROM sales_daily WHERE SaleDate IN (SELECT SaleDate FROM touched_dates)")
+    for group_type, group_key in SALES_DAILY_GROUPS.items():
+        cursor.execute(f"""
+            INSERT INTO sales_daily (GroupType, GroupKey, SaleDate, Revenue, TransactionCount)
+            SELECT ?, {group_key}, t.SaleDate, SUM(s.SaleAmount), COUNT(*)
+            FROM touched_dates AS t
+            JOIN sales AS s ON s.SaleDate >= t.SaleDate AND s.SaleDate < date(t.SaleDate, '+1 day')
+            LEFT JOIN states AS st ON st.StateKey = s.StateKey
+            GROUP BY {group_key}, t.SaleDate
+        """, (group_type,))
+
+    # Refresh the moving averages of every day whose 28-day window includes a touched day (one of
+    # the 27 days after a touched day), from the days those windows cover (27 days either side).
+    # Touched days far apart (e.g. a late correction and today's sales) don't refresh the days between.
+    cursor.execute("""
+        UPDATE sales_daily
+        SET Revenue7DayAvg = w.Avg7, Revenue28DayAvg = w.Avg28
+        FROM (
+            SELECT GroupType, GroupKey, SaleDate,
+                   SUM(Revenue) OVER (
+                       PARTITION BY GroupType, GroupKey ORDER BY julianday(SaleDate)
+                       RANGE BETWEEN 6 PRECEDING AND CURRENT ROW
+                   ) / 7.0 AS Avg7,
+                   SUM(Revenue) OVER (
+                       PARTITION BY GroupType, GroupKey ORDER BY julianday(SaleDate)
+                       RANGE BETWEEN 27 PRECEDING AND CURRENT ROW
+                   ) / 28.0 AS Avg28
+            FROM sales_daily AS d
+            WHERE EXISTS (
+                SELECT 1 FROM touched_dates AS t
+                WHERE t.SaleDate BETWEEN date(d.SaleDate, '-27 days') AND date(d.SaleDate, '+27 days')
+            )
+        ) AS w
+        WHERE sales_daily.GroupType = w.GroupType
+          AND sales_daily.GroupKey = w.GroupKey
+          AND sales_daily.SaleDate = w.SaleDate
+          AND EXISTS (
+              SELECT 1 FROM touched_dates AS t
+              WHERE t.SaleDate BETWEEN date(sales_daily.SaleDate, '-27 days') AND sales_daily.SaleDate
+          )
+    """)
+
+    cursor.execute("DROP TABLE touched_dates")
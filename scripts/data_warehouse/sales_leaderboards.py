@@ -0,0 +1,80 @@
+"""
+Data Warehouse Maintenance - Sales Leaderboards
+File: scripts/data_warehouse/sales_leaderboards.py
+
+Maintains the `sales_totals` table: running total sales and transaction counts for
+every customer, product and store. Each load adds its signed sales changes to the
+totals instead of re-aggregating the sales table, and an index on
+(EntityType, TotalSales) lets the leaderboard views return the top entries
+without sorting, however large the sales history grows.
+
+    SELECT * FROM customer_leaderboard LIMIT 5;
+"""
+
+import sqlite3
+from typing import List, Tuple
+
+import pandas as pd
+
+# Entity type -> (id column in sales, dimension table, dimension id column, dimension name column)
+LEADERBOARD_ENTITIES = {
+    "customer": ("CustomerID", "customers", "CustomerID", "Name"),
+    "product": ("ProductID", "products", "ProductID", "ProductName"),
+    "store": ("StoreID", "stores", "StoreID", "StoreName"),
+}
+
+def create_leaderboard_schema(cursor: sqlite3.Cursor) -> None:
+    """Create the sales_totals table and the leaderboard views if they don't exist."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_totals (
+            EntityType TEXT,
+            EntityID INTEGER,
+            TotalSales REAL,
+            TransactionCount INTEGER,
+            PRIMARY KEY (EntityType, EntityID)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_totals_rank ON sales_totals (EntityType, TotalSales DESC)")
+    for entity_type, (id_column, table, table_id, name_column) in LEADERBOARD_ENTITIES.items():
+        cursor.execute(f"""
+            CREATE VIEW IF NOT EXISTS {entity_type}_leaderboard AS
+            SELECT t.EntityID AS {id_column}, d.{name_column}, t.TotalSales, t.TransactionCount
+            FROM sales_totals AS t
+            LEFT JOIN {table} AS d ON d.{table_id} = t.EntityID
+            WHERE t.EntityType = '{entity_type}'
+            ORDER BY t.TotalSales DESC
+        """)
+
+def apply_sales_changes(cursor: sqlite3.Cursor, sales_changes: pd.DataFrame) -> None:
+    """
+    Add the signed sales changes of a load to the running totals.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor on the data warehouse.
+        sales_changes (pd.DataFrame): Signed sales changes, see etl_to_dw.signed_sales_changes.
+    """
+    rows: List[Tuple[str, int, float, int]] = []
+    for entity_type, (id_column, _, _, _) in LEADERBOARD_ENTITIES.items():
+        totals = sales_changes.groupby(id_column)[["SaleAmount", "Sign"]].sum()
+        rows.extend((entity_type, int(i), float(amount), int(count))
+                    for i, amount, count in totals.itertuples())
+
+    cursor.executemany("""
+        INSERT INTO sales_totals (EntityType, EntityID, TotalSales, TransactionCount)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (EntityType, EntityID) DO UPDATE SET
+            TotalSales = TotalSales + excluded.TotalSales,
+            TransactionCount = TransactionCount + excluded.TransactionCount
+    """, rows)
+    cursor.execute("DELETE FROM sales_totals WHERE TransactionCount = 0")
+
+def top_k(cursor: sqlite3.Cursor, entity_type: str, k: int = 10) -> pd.DataFrame:
+    """
+    Return the k customers, products or stores with the highest total sales.
+
+    Raises:
+        ValueError: If entity_type is not 'customer', 'product' or 'store'.
+    """
+    if entity_type not in LEADERBOARD_ENTITIES:
+        raise ValueError(f"Unknown leaderboard '{entity_type}'. Choose from {list(LEADERBOARD_ENTITIES)}.")
+    return pd.read_sql_query(f"SELECT * FROM {entity_type}_leaderboard LIMIT ?", cursor.connection, params=(k,))
@@ -0,0 +1,271 @@
+"""
+Data Warehouse Maintenance - Stratified Sales Samples
+File: scripts/data_warehouse/sales_samples.py
+
+Maintains stratified samples of the sales table, one per sample rate (1% and 10% by
+default), for quick approximate answers while exploring:
+
+- sales_sample: copies of the sampled sales rows (with State and StateCode, as in
+  sales_with_state), with their SampleRate, SaleMonth and Stratum.
+- sales_sample_strata: per sample rate, month and stratum, the number of sales in the
+  stratum and how many of them are in the sample.
+
+Sales are stratified by store, state code and month. Each stratum keeps round(rate * rows)
+of its sales, which must be at least MIN_SAMPLE_ROWS so its variance can be estimated.
+A store's sales in a state and month that are too few for that are pooled with the other
+such sales of that state and month, and if those are still too few, with those of the
+whole month; keeping MIN_SAMPLE_ROWS of every small stratum instead would make the sample
+far bigger than the rate (with many small strata, most of the table). A month still too
+small is kept whole. Which sales are kept is decided by a fixed hash of the TransactionID,
+so a stratum's sample only changes when its sales do. Each load resamples the months it
+touched.
+
+approximate_aggregate() runs a SUM, COUNT or AVG on a sample, scales it up to the whole
+table and returns a confidence interval with it:
+
+    approximate_aggregate(cursor, "sum", group_by=["StateCode"], rate=0.01)
+
+Use it to find the shape of an answer, then run the final numbers on the sales table.
+"""
+
+import sqlite3
+from statistics import NormalDist
+from typing import Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+DEFAULT_SAMPLE_RATES = (0.01, 0.10)
+MIN_SAMPLE_ROWS = 2
+
+# Multiplicative hash of the TransactionID, ordering the sales of a stratum pseudo-randomly
+SAMPLE_ORDER = "(s.TransactionID * 2654435761) % 4294967296, s.TransactionID"
+
+def create_sample_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the sample tables if they don't exist. Both are clustered by sample rate and stratum,
+    so an aggregate over a sample reads it in one sequential pass.
+
+    Samples stratified by StateKey (before Stratum existed) are dropped, to be rebuilt by the next load.
+    """
+    if "Stratum" not in {row[1] for row in cursor.execute("PRAGMA table_info(sales_sample_strata)")}:
+        cursor.execute("DROP TABLE IF EXISTS sales_sample")
+        cursor.execute("DROP TABLE IF EXISTS sales_sample_strata")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_sample (
+            SampleRate REAL,
+            TransactionID INTEGER,
+            CustomerID INTEGER,
+            ProductID INTEGER,
+            StoreID INTEGER,
+            CampaignID INTEGER,
+            SaleAmount REAL,
+            SaleDate TEXT,
+            State TEXT,
+            Discount REAL,
+            StateCode TEXT,
+            SaleMonth TEXT,
+            Stratum TEXT,
+            PRIMARY KEY (SampleRate, SaleMonth, Stratum, TransactionID)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_sample_strata (
+            SampleRate REAL,
+            SaleMonth TEXT,
+            Stratum TEXT,
+            StratumRows INTEGER,
+            SampleRows INTEGER,
+            PRIMARY KEY (SampleRate, SaleMonth, Stratum)
+        ) WITHOUT ROWID
+    """)
+
+def _resample_months(cursor: sqlite3.Cursor) -> None:
+    """
+    Rebuild the samples at the rates in the sample_rates temp table for the months in the
+    touched_months temp table.
+    """
+    for table in ("sales_sample", "sales_sample_strata"):
+        cursor.execute(f"""
+            DELETE FROM {table}
+            WHERE SampleRate IN (SELECT SampleRate FROM sample_rates) AND SaleMonth IN (SELECT SaleMonth FROM touched_months)
+        """)
+
+    cursor.execute("DROP TABLE IF EXISTS month_sales")
+    cursor.execute("""
+        CREATE TEMP TABLE month_sales AS
+        SELECT s.*, t.SaleMonth
+        FROM touched_months AS t
+        JOIN sales_with_state AS s ON s.SaleDate >= t.SaleMonth || '-01' AND s.SaleDate < date(t.SaleMonth || '-01', '+1 month')
+    """)
+    cursor.execute("CREATE INDEX temp.month_sales_transactions ON month_sales (TransactionID)")
+
+    # Stratum of each store's sales in a state and month at each rate: their own if there are
+    # enough of them for the rate, else the pooled small stores' sales of the state and month,
+    # else (those still too few) the pooled small sales of the month. Decided on the counts alone.
+    cursor.execute("DROP TABLE IF EXISTS store_strata")
+    cursor.execute("""
+        CREATE TEMP TABLE store_strata AS
+        SELECT SampleRate, SaleMonth, StateCode, StoreID, StoreRows,
+               CASE WHEN StoreLarge THEN 'store ' || StoreID || ' ' || COALESCE(StateCode, '')
+                    WHEN SampleRate * SUM(StoreRows) OVER (PARTITION BY SampleRate, SaleMonth, StateCode, StoreLarge) >= :min_rows
+                    THEN 'state ' || COALESCE(StateCode, '')
+                    ELSE 'month' END AS Stratum
+        FROM (
+            SELECT r.SampleRate, c.*, r.SampleRate * c.StoreRows >= :min_rows AS StoreLarge
+            FROM (
+                SELECT SaleMonth, StateCode, StoreID, COUNT(*) AS StoreRows
+                FROM month_sales
+                GROUP BY SaleMonth, StateCode, StoreID
+            ) AS c
+            CROSS JOIN sample_rates AS r
+        )
+    """, {"min_rows": MIN_SAMPLE_ROWS})
+    cursor.execute("""
+        INSERT INTO sales_sample_strata (SampleRate, SaleMonth, Stratum, StratumRows, SampleRows)
+        SELECT SampleRate, SaleMonth, Stratum, SUM(StoreRows),
+               CASE WHEN SampleRate * SUM(StoreRows) >= :min_rows THEN ROUND(SampleRate * SUM(StoreRows)) ELSE SUM(StoreRows) END
+        FROM store_strata
+        GROUP BY SampleRate, SaleMonth, Stratum
+    """, {"min_rows": MIN_SAMPLE_ROWS})
+
+    # Rank the sales of each stratum by the hash and keep the first SampleRows; ranking only
+    # the keys and joining the kept rows back sorts far less data than ranking whole rows
+    cursor.execute(f"""
+        INSERT INTO sales_sample
+        SELECT k.SampleRate, s.TransactionID, s.CustomerID, s.ProductID, s.StoreID, s.CampaignID, s.SaleAmount,
+               s.SaleDate, s.State, s.Discount, s.StateCode, s.SaleMonth, k.Stratum
+        FROM (
+            SELECT s.TransactionID, h.SampleRate, h.SaleMonth, h.Stratum,
+                   ROW_NUMBER() OVER (PARTITION BY h.SampleRate, h.SaleMonth, h.Stratum ORDER BY {SAMPLE_ORDER}) AS SampleRank
+            FROM month_sales AS s
+            JOIN store_strata AS h ON h.SaleMonth = s.SaleMonth AND h.StateCode IS s.StateCode AND h.StoreID IS s.StoreID
+        ) AS k
+        JOIN sales_sample_strata AS h USING (SampleRate, SaleMonth, Stratum)
+        JOIN month_sales AS s USING (TransactionID)
+        WHERE k.SampleRank <= h.SampleRows
+    """)
+    cursor.execute("DROP TABLE month_sales")
+    cursor.execute("DROP TABLE store_strata")
+
+def update_sales_samples(cursor: sqlite3.Cursor, sale_dates: Iterable[str],
+                         rates: Sequence[float] = DEFAULT_SAMPLE_RATES) -> None:
+    """
+    Resample the months of the given sale dates, at every sample rate.
+
+    Samples at rates no longer asked for are dropped, and samples at new rates are built
+    over the whole sales table.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor on the data warehouse.
+        sale_dates (iterable): ISO-8601 dates (YYYY-MM-DD) whose sales were inserted, changed or removed.
+        rates (sequence of float): Fractions of each stratum to sample, between 0 and 1.
+
+    Raises:
+        ValueError: If a rate is not between 0 and 1.
+    """
+    for rate in rates:
+        if not 0 < rate <= 1:
+            raise ValueError(f"Sample rate {rate} must be greater than 0 and at most 1.")
+    rates = sorted(set(float(rate) for rate in rates))
+    touched_months = sorted({d[:7] for d in sale_dates})
+    existing_rates = {r for (r,) in cursor.execute("SELECT DISTINCT SampleRate FROM sales_sample_strata")}
+    for rate in existing_rates - set(rates):
+        cursor.execute("DELETE FROM sales_sample WHERE SampleRate = ?", (rate,))
+        cursor.execute("DELETE FROM sales_sample_strata WHERE SampleRate = ?", (rate,))
+
+    # Resample the touched months at the existing rates, and every month at the new rates
+    new_rates = [r for r in rates if r not in existing_rates]
+    all_months = [m for (m,) in cursor.execute("SELECT DISTINCT substr(SaleDate, 1, 7) FROM sales")] if new_rates else []
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS touched_months (SaleMonth TEXT PRIMARY KEY)")
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS sample_rates (SampleRate REAL PRIMARY KEY)")
+    for sample_rates, months in (([r for r in rates if r in existing_rates], touched_months), (new_rates, all_months)):
+        if not sample_rates or not months:
+            continue
+        cursor.execute("DELETE FROM touched_months")
+        cursor.executemany("INSERT INTO touched_months VALUES (?)", [(m,) for m in months])
+        cursor.execute("DELETE FROM sample_rates")
+        cursor.executemany("INSERT INTO sample_rates VALUES (?)", [(r,) for r in sample_rates])
+        _resample_months(cursor)
+    cursor.execute("DROP TABLE touched_months")
+    cursor.execute("DROP TABLE sample_rates")
+
+def approximate_aggregate(cursor: sqlite3.Cursor, aggregate: str = "sum", value: str = "SaleAmount",
+                          group_by: Optional[List[str]] = None, where: Optional[str] = None, params: tuple = (),
+                          rate: float = DEFAULT_SAMPLE_RATES[0], confidence: float = 0.95) -> pd.DataFrame:
+    """
+    Estimate an aggregate over the sales table from the sample at the given rate.
+
+    Sums and counts are stratified estimates (each sampled row stands for StratumRows / SampleRows
+    sales of its stratum), averages are their ratio. Standard errors include the finite population
+    correction, so strata sampled in full add no error.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor on the data warehouse.
+        aggregate (str): 'sum', 'count' or 'avg'.
+        value (str): Column or SQL expression to aggregate (ignored for 'count').
+        group_by (list of str, optional): Columns to group by: columns of sales_with_state
+                                          (e.g. StoreID, StateCode) or SaleMonth.
+        where (str, optional): SQL condition on the same columns selecting the sales to aggregate,
+                               with ? placeholders for params.
+        params (tuple): Values for the placeholders in where.
+        rate (float): Sample rate to use, one of the rates the ETL maintains.
+        confidence (float): Confidence level of the Lower and Upper bounds.
+
+    Returns:
+        pd.DataFrame: One row per group with Estimate, StdError, Lower, Upper and SampleRows
+                      (the number of sampled sales the estimate is based on).
+
+    Raises:
+        ValueError: If the aggregate is unknown or there is no sample at the given rate.
+    """
+    if aggregate not in ("sum", "count", "avg"):
+        raise ValueError(f"Unknown aggregate '{aggregate}'. Choose from ['sum', 'count', 'avg'].")
+    if cursor.execute("SELECT 1 FROM sales_sample_strata WHERE SampleRate = ? LIMIT 1", (rate,)).fetchone() is None:
+        rates = [r for (r,) in cursor.execute("SELECT DISTINCT SampleRate FROM sales_sample_strata ORDER BY 1")]
+        raise ValueError(f"No sample at rate {rate}. Available rates: {rates}.")
+    group_by = group_by or []
+    value = "1" if aggregate == "count" else value
+
+    # Per group and stratum h, with N rows of which n sampled and d in the domain (matching where),
+    # sum the value y and y^2 over the domain. The stratum's estimate is N / n * sum(y), and its
+    # variance factor N^2 (1 - n/N) / (n (n - 1)) multiplies the sum of squared deviations of y over
+    # all n sampled rows (rows outside the domain counting as y = 0). For averages, the deviations
+    # are those of the residuals y - R x, x = 1 in the domain: expanded into A - 2 R B + R^2 C.
+    group_columns = "".join(f"{column}, " for column in group_by)
+    result = pd.read_sql_query(f"""
+        SELECT {group_columns}
+               SUM(StratumRows * 1.0 / SampleRows * ValueSum) AS WeightedSum,
+               SUM(StratumRows * 1.0 / SampleRows * DomainRows) AS WeightedRows,
+               SUM(VarianceFactor * (ValueSquares - ValueSum * ValueSum * 1.0 / SampleRows)) AS A,
+               SUM(VarianceFactor * (ValueSum - ValueSum * DomainRows * 1.0 / SampleRows)) AS B,
+               SUM(VarianceFactor * (DomainRows - DomainRows * DomainRows * 1.0 / SampleRows)) AS C,
+               SUM(DomainRows) AS SampleRows
+        FROM (
+            SELECT {group_columns}h.StratumRows, h.SampleRows,
+                   CASE WHEN h.SampleRows > 1
+                        THEN h.StratumRows * (h.StratumRows - h.SampleRows) * 1.0 / h.SampleRows / (h.SampleRows - 1)
+                        ELSE 0 END AS VarianceFactor,
+                   COUNT(*) AS DomainRows, SUM({value}) AS ValueSum, SUM(({value}) * ({value})) AS ValueSquares
+            FROM sales_sample
+            JOIN sales_sample_strata AS h USING (SampleRate, SaleMonth, Stratum)
+            WHERE SampleRate = ? AND ({where or 1})
+            GROUP BY {group_columns}SaleMonth, Stratum
+        )
+        {"GROUP BY " + ", ".join(group_by) if group_by else ""}
+    """, cursor.connection, params=(rate, *params))
+
+    if aggregate == "sum":
+        result["Estimate"], variance = result["WeightedSum"], result["A"]
+    elif aggregate == "count":
+        result["Estimate"], variance = result["WeightedRows"], result["C"]
+    else:
+        ratio = result["WeightedSum"] / result["WeightedRows"]
+        result["Estimate"] = ratio
+        variance = (result["A"] - 2 * ratio * result["B"] + ratio ** 2 * result["C"]) / result["WeightedRows"] ** 2
+    result["StdError"] = variance.clip(lower=0) ** 0.5
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    result["Lower"] = result["Estimate"] - z * result["StdError"]
+    result["Upper"] = result["Estimate"] + z * result["StdError"]
+    result = result[group_by + ["Estimate", "StdError", "Lower", "Upper", "SampleRows"]]
+    result = result[result["SampleRows"] > 0].astype({"SampleRows": "int64"})
+    return result.reset_index(drop=True)
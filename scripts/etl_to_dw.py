@@ -1,21 +1,27 @@
+import argparse
 import pandas as pd
+import re
 import sqlite3
 import pathlib
 import sys
+from typing import Dict, Optional, Sequence, Set, Union
 
 # For local imports, temporarily add project root to sys.path
 PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
+from scripts.data_warehouse import customer_referrals, sales_daily, sales_leaderboards, sales_samples
+
 # Constants
 DW_DIR = pathlib.Path("data/").joinpath("dw")
 DB_PATH = DW_DIR.joinpath("smart_sales.db")
+DUCKDB_PATH = DW_DIR.joinpath("smart_sales.duckdb")
 PREPARED_DATA_DIR = pathlib.Path("data").joinpath("prepared")
+TABLE_NAMES = ["customers", "products", "sales", "suppliers", "stores", "campaigns"]
 
-def create_schema(cursor: sqlite3.Cursor) -> None:
-    """Create tables in the data warehouse if they don't exist."""
-    cursor.execute("""
+BASE_TABLES_DDL = [
+    """
         CREATE TABLE IF NOT EXISTS customers (
             CustomerID INTEGER PRIMARY KEY,
             Name TEXT,
@@ -26,9 +32,8 @@ def create_schema(cursor: sqlite3.Cursor) -> None:
             Birthday TEXT,
             FOREIGN KEY (ReferringCustomer) REFERENCES customer (CustomerID)
         )
-    """)
-    
-    cursor.execute("""
+    """,
+    """
         CREATE TABLE IF NOT EXISTS products (
             ProductID INTEGER PRIMARY KEY,
             ProductName TEXT,
@@ -38,9 +43,8 @@ def create_schema(cursor: sqlite3.Cursor) -> None:
             RemainingInventory INTEGER,
             FOREIGN KEY (Supplier) REFERENCES suppliers (SupplierID)
         )
-    """)
-     
-    cursor.execute("""
+    """,
+    """
         CREATE TABLE IF NOT EXISTS sales (
             TransactionID INTEGER PRIMARY KEY,
             CustomerID INTEGER,
@@ -49,38 +53,88 @@ def create_schema(cursor: sqlite3.Cursor) -> None:
             CampaignID INTEGER,
             SaleAmount REAL,
             SaleDate TEXT,
-            State TEXT,
+            StateKey INTEGER,
             Discount REAL,
-            StateCode TEXT,
             FOREIGN KEY (CustomerID) REFERENCES customers (CustomerID),
             FOREIGN KEY (ProductID) REFERENCES products (ProductID),
             FOREIGN KEY (StoreID) REFERENCES stores (StoreID),
-            FOREIGN KEY (CampaignID) REFERENCES campaigns (CampaignID)
+            FOREIGN KEY (CampaignID) REFERENCES campaigns (CampaignID),
+            FOREIGN KEY (StateKey) REFERENCES states (StateKey)
         )
-    """)
-
-    cursor.execute("""
+    """,
+    """
         CREATE TABLE IF NOT EXISTS stores (
             StoreID INTEGER PRIMARY KEY,
             StoreName TEXT,
             StoreLocation TEXT
         )
-    """)
-
-    cursor.execute("""
+    """,
+    """
         CREATE TABLE IF NOT EXISTS campaigns (
             CampaignID INTEGER PRIMARY KEY,
             CampaignName TEXT
         )
-    """)
-
-    cursor.execute("""
+    """,
+    """
         CREATE TABLE IF NOT EXISTS suppliers (
             SupplierID INTEGER PRIMARY KEY,
             SupplierName TEXT
         )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS states (
+            StateKey INTEGER PRIMARY KEY,
+            State TEXT,
+            StateCode TEXT
+        )
+    """,
+    # Compatibility view with the sales columns as they were before State and StateCode moved to states
+    """
+        CREATE VIEW IF NOT EXISTS sales_with_state AS
+        SELECT s.TransactionID, s.CustomerID, s.ProductID, s.StoreID, s.CampaignID, s.SaleAmount, s.SaleDate,
+               st.State, s.Discount, st.StateCode
+        FROM sales AS s
+        LEFT JOIN states AS st ON st.StateKey = s.StateKey
+    """,
+]
+
+def migrate_sales_state_columns(cursor: sqlite3.Cursor) -> bool:
+    """
+    Move the State and StateCode columns of a sales table created before the states table existed
+    into states, keeping the sales rows. Must run before the new schema is created.
+
+    Returns:
+        bool: True if the sales table was migrated, False if there was nothing to migrate.
+    """
+    columns = [name for _, name, *_ in cursor.execute("PRAGMA table_info(sales)")]
+    if "StateCode" not in columns:
+        return False
+
+    # Dropping the renamed table drops its indexes too, so they are recreated on the new one
+    cursor.execute("ALTER TABLE sales RENAME TO sales_before_states")
+    for ddl in BASE_TABLES_DDL:
+        cursor.execute(ddl)
+    cursor.execute("INSERT INTO states (State, StateCode) SELECT DISTINCT State, StateCode FROM sales_before_states")
+    cursor.execute("""
+        INSERT INTO sales (TransactionID, CustomerID, ProductID, StoreID, CampaignID, SaleAmount, SaleDate, StateKey, Discount)
+        SELECT o.TransactionID, o.CustomerID, o.ProductID, o.StoreID, o.CampaignID, o.SaleAmount, o.SaleDate,
+               st.StateKey, o.Discount
+        FROM sales_before_states AS o
+        JOIN states AS st ON st.State IS o.State AND st.StateCode IS o.StateCode
     """)
+    cursor.execute("DROP TABLE sales_before_states")
+    return True
+
+def create_schema(cursor: sqlite3.Cursor) -> None:
+    """Create tables in the data warehouse if they don't exist."""
+    migrate_sales_state_columns(cursor)
+    for ddl in BASE_TABLES_DDL:
+        cursor.execute(ddl)
 
+    sales_daily.create_sales_daily_schema(cursor)
+    customer_referrals.create_referral_schema(cursor)
+    sales_leaderboards.create_leaderboard_schema(cursor)
+    sales_samples.create_sample_schema(cursor)
 
 def delete_existing_records(cursor: sqlite3.Cursor) -> None:
     """Delete all existing records from all tables."""
@@ -90,41 +144,273 @@ def delete_existing_records(cursor: sqlite3.Cursor) -> None:
     cursor.execute("DELETE FROM suppliers")
     cursor.execute("DELETE FROM stores")
     cursor.execute("DELETE FROM campaigns")
+    cursor.execute("DELETE FROM states")
+    cursor.execute("DELETE FROM sales_daily")
+    cursor.execute("DELETE FROM customer_referrals")
+    cursor.execute("DELETE FROM referral_sales")
+    cursor.execute("DELETE FROM referral_cuts")
+    cursor.execute("DELETE FROM sales_totals")
+    cursor.execute("DELETE FROM sales_sample")
+    cursor.execute("DELETE FROM sales_sample_strata")
+
+def _upsert_rows(table, conn, keys, data_iter) -> None:
+    """pandas.to_sql insertion method that replaces rows with the same primary key."""
+    columns = ", ".join(keys)
+    placeholders = ", ".join("?" for _ in keys)
+    conn.executemany(f"INSERT OR REPLACE INTO {table.name} ({columns}) VALUES ({placeholders})", list(data_iter))
+
+def insert_to_table(df: pd.DataFrame, tablename: str, cursor: sqlite3.Cursor, upsert: bool = False) -> None:
+    """Insert data into a table, replacing rows with the same primary key if upsert is True."""
+    df.to_sql(tablename, cursor.connection, if_exists="append", index=False, method=_upsert_rows if upsert else None)
+
+def fetch_replaced_sales(cursor: sqlite3.Cursor, sales_df: pd.DataFrame) -> pd.DataFrame:
+    """Return the sales rows already in the warehouse that share a TransactionID with sales_df."""
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS loaded_ids (TransactionID INTEGER PRIMARY KEY)")
+    cursor.execute("DELETE FROM loaded_ids")
+    cursor.executemany("INSERT OR IGNORE INTO loaded_ids VALUES (?)", [(int(i),) for i in sales_df["TransactionID"]])
+    replaced = pd.read_sql_query(
+        "SELECT s.* FROM sales AS s JOIN loaded_ids AS l ON s.TransactionID = l.TransactionID",
+        cursor.connection,
+    )
+    cursor.execute("DROP TABLE loaded_ids")
+    return replaced
+
+def signed_sales_changes(sales_df: pd.DataFrame, replaced_sales_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return the change a load makes to the sales table as signed rows.
+
+    Loaded sales count once (Sign 1) and the sales they replaced count negatively (Sign -1,
+    with a negated SaleAmount), so summing any column grouped by any key gives that key's change.
+    """
+    columns = ["CustomerID", "ProductID", "StoreID", "SaleAmount"]
+    added = sales_df[columns].astype({"SaleAmount": "float64"}).assign(Sign=1)
+    removed = replaced_sales_df[columns].astype({"SaleAmount": "float64"}).assign(Sign=-1)
+    removed["SaleAmount"] = -removed["SaleAmount"]
+    return pd.concat([added, removed], ignore_index=True)
+
+def encode_states(warehouse: "Warehouse", sales_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replace the State and StateCode columns of sales_df with the StateKey of that pair in the
+    states table, adding the pairs the warehouse hasn't seen yet to states.
+
+    Parameters:
+        warehouse (SQLiteWarehouse or DuckDBWarehouse): Open data warehouse.
+        sales_df (pd.DataFrame): Prepared sales rows.
+
+    Returns:
+        pd.DataFrame: The sales rows with a StateKey column instead of State and StateCode.
+    """
+    state_columns = ["State", "StateCode"]
+    states = warehouse.query("SELECT StateKey, State, StateCode FROM states").astype({c: object for c in state_columns})
+    loaded = sales_df[state_columns].astype(object).drop_duplicates()
+    new_states = loaded.merge(states, on=state_columns, how="left")
+    new_states = new_states[new_states["StateKey"].isna()]
+    if not new_states.empty:
+        first_key = int(states["StateKey"].max()) + 1 if not states.empty else 1
+        new_states = new_states.assign(StateKey=range(first_key, first_key + len(new_states)))
+        warehouse.insert_to_table(new_states[["StateKey"] + state_columns], "states")
+        states = pd.concat([states, new_states], ignore_index=True)
 
-def insert_to_table(df: pd.DataFrame, tablename: str, cursor: sqlite3.Cursor) -> None:
-    """Insert sales data into the sales table."""
-    df.to_sql(tablename, cursor.connection, if_exists="append", index=False)
+    state_keys = sales_df[state_columns].astype(object).merge(states, on=state_columns, how="left")["StateKey"]
+    columns = [c for c in sales_df.columns if c not in state_columns]
+    return sales_df[columns].assign(StateKey=state_keys.astype("int64").to_numpy())
 
-def load_data_to_db() -> None:
-    try:
+def sale_dates_of(sales_df: pd.DataFrame) -> Set[str]:
+    """Return the distinct sale dates (YYYY-MM-DD) of a sales DataFrame."""
+    return set(pd.to_datetime(sales_df["SaleDate"]).dt.strftime("%Y-%m-%d"))
+
+def read_prepared_tables() -> Dict[str, pd.DataFrame]:
+    """Read the prepared CSV files, keyed by table name."""
+    return {
+        table_name: pd.read_csv(PREPARED_DATA_DIR.joinpath(f"{table_name}_data_prepared.csv"))
+        for table_name in TABLE_NAMES
+    }
+
+class SQLiteWarehouse:
+    """
+    Data warehouse in a SQLite file (row store). This is the default backend, and the only
+    one that maintains the derived tables (sales_daily, customer_referrals, referral_sales,
+    sales_totals), since those exist to spare the row store from full-table scans.
+    """
+
+    def __init__(self, db_path: pathlib.Path):
         # Connect to SQLite – will create the file if it doesn't exist
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        self.conn = sqlite3.connect(db_path)
+        self.cursor = self.conn.cursor()
+
+    def __enter__(self) -> "SQLiteWarehouse":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def create_schema(self) -> None:
+        create_schema(self.cursor)
+
+    def delete_existing_records(self) -> None:
+        delete_existing_records(self.cursor)
+
+    def insert_to_table(self, df: pd.DataFrame, tablename: str, upsert: bool = False) -> None:
+        insert_to_table(df, tablename, self.cursor, upsert)
+
+    def fetch_replaced_sales(self, sales_df: pd.DataFrame) -> pd.DataFrame:
+        return fetch_replaced_sales(self.cursor, sales_df)
+
+    def update_derived_tables(self, sales_changes: pd.DataFrame, sale_dates: Set[str], customers_df: pd.DataFrame,
+                              incremental: bool, sample_rates: Sequence[float] = sales_samples.DEFAULT_SAMPLE_RATES) -> None:
+        """Bring the derived tables up to date with a load's sales and customers."""
+        sales_daily.update_sales_daily(self.cursor, sale_dates)
+        sales_leaderboards.apply_sales_changes(self.cursor, sales_changes)
+        sales_samples.update_sales_samples(self.cursor, sale_dates, sample_rates)
+        if incremental:
+            customer_referrals.apply_sales_changes(self.cursor, sales_changes)
+            customer_referrals.update_customer_referrals(self.cursor, customers_df)
+        else:
+            customer_referrals.rebuild_customer_referrals(self.cursor)
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        """Run an analytic (read-only) query and return its result."""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+class DuckDBWarehouse:
+    """
+    Data warehouse in an embedded DuckDB file (column store), for aggregate-heavy analysis.
+    Holds the same base tables as SQLiteWarehouse; aggregates are computed at query time.
+    Requires the optional `duckdb` package.
+    """
+
+    def __init__(self, db_path: pathlib.Path):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("The DuckDB warehouse backend needs the duckdb package: pip install duckdb")
+        self.conn = duckdb.connect(str(db_path))
+
+    def __enter__(self) -> "DuckDBWarehouse":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def create_schema(self) -> None:
+        for ddl in BASE_TABLES_DDL:
+            # DuckDB's REAL is single precision, and its foreign keys must point at existing
+            # tables and would block reloading dimension rows, so they are left out
+            ddl = re.sub(r",\s*FOREIGN KEY \(\w+\) REFERENCES \w+ \(\w+\)", "", ddl)
+            self.conn.execute(ddl.replace(" REAL", " DOUBLE"))
 
+    def delete_existing_records(self) -> None:
+        for table_name in TABLE_NAMES + ["states"]:
+            self.conn.execute(f"DELETE FROM {table_name}")
+
+    def insert_to_table(self, df: pd.DataFrame, tablename: str, upsert: bool = False) -> None:
+        """Insert data into a table, replacing rows with the same primary key if upsert is True."""
+        self.conn.register("incoming_rows", df)
+        try:
+            self.conn.execute(f"INSERT {'OR REPLACE ' if upsert else ''}INTO {tablename} BY NAME SELECT * FROM incoming_rows")
+        finally:
+            self.conn.unregister("incoming_rows")
+
+    def fetch_replaced_sales(self, sales_df: pd.DataFrame) -> pd.DataFrame:
+        """Return the sales rows already in the warehouse that share a TransactionID with sales_df."""
+        self.conn.register("loaded_ids", sales_df[["TransactionID"]])
+        try:
+            return self.conn.execute(
+                "SELECT s.* FROM sales AS s WHERE s.TransactionID IN (SELECT TransactionID FROM loaded_ids)"
+            ).df()
+        finally:
+            self.conn.unregister("loaded_ids")
+
+    def update_derived_tables(self, sales_changes: pd.DataFrame, sale_dates: Set[str], customers_df: pd.DataFrame,
+                              incremental: bool, sample_rates: Sequence[float] = sales_samples.DEFAULT_SAMPLE_RATES) -> None:
+        """No derived tables: the column store answers these aggregates directly."""
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        """Run an analytic (read-only) query and return its result."""
+        return self.conn.execute(sql, list(params)).df()
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+Warehouse = Union[SQLiteWarehouse, DuckDBWarehouse]
+WAREHOUSE_BACKENDS = {"sqlite": SQLiteWarehouse, "duckdb": DuckDBWarehouse}
+
+def open_warehouse(backend: str = "sqlite", db_path: Optional[pathlib.Path] = None) -> Warehouse:
+    """
+    Open the data warehouse with the given backend ('sqlite' or 'duckdb').
+
+    Use it for analytic reads too, e.g. from a notebook:
+
+        with open_warehouse("duckdb") as warehouse:
+            df = warehouse.query("SELECT StateCode, SUM(SaleAmount) FROM sales_with_state GROUP BY StateCode")
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in WAREHOUSE_BACKENDS:
+        raise ValueError(f"Unknown warehouse backend '{backend}'. Choose from {list(WAREHOUSE_BACKENDS)}.")
+    if db_path is None:
+        db_path = DUCKDB_PATH if backend == "duckdb" else DB_PATH
+    return WAREHOUSE_BACKENDS[backend](db_path)
+
+def load_data_to_db(prepared_tables: Optional[Dict[str, pd.DataFrame]] = None, incremental: bool = False,
+                    backend: str = "sqlite", sample_rates: Sequence[float] = sales_samples.DEFAULT_SAMPLE_RATES) -> None:
+    """
+    Load the prepared tables into the data warehouse.
+
+    Parameters:
+        prepared_tables (dict, optional): Prepared DataFrames keyed by table name, handed over
+                                          in-process by data_prep.py. If not given, the prepared
+                                          CSV files are read instead.
+        incremental (bool): If True, keep the existing records and add the prepared rows to them,
+                            replacing rows with the same primary key. Otherwise, replace everything.
+        backend (str): Warehouse backend to load into, 'sqlite' (default) or 'duckdb'.
+        sample_rates (sequence of float): Rates of the stratified sales samples to maintain (SQLite only).
+    """
+    with open_warehouse(backend) as warehouse:
         # Create schema and clear existing records
-        create_schema(cursor)
-        delete_existing_records(cursor)
+        warehouse.create_schema()
+        if not incremental:
+            warehouse.delete_existing_records()
 
         # Load prepared data using pandas
-        customers_df = pd.read_csv(PREPARED_DATA_DIR.joinpath("customers_data_prepared.csv"))
-        products_df = pd.read_csv(PREPARED_DATA_DIR.joinpath("products_data_prepared.csv"))
-        sales_df = pd.read_csv(PREPARED_DATA_DIR.joinpath("sales_data_prepared.csv"))
-        suppliers_df = pd.read_csv(PREPARED_DATA_DIR.joinpath("suppliers_data_prepared.csv"))
-        stores_df = pd.read_csv(PREPARED_DATA_DIR.joinpath("stores_data_prepared.csv"))
-        campaigns_df = pd.read_csv(PREPARED_DATA_DIR.joinpath("campaigns_data_prepared.csv"))
-
-        # Insert data into the database
-        insert_to_table(customers_df, 'customers', cursor)
-        insert_to_table(products_df, 'products', cursor)
-        insert_to_table(sales_df, 'sales', cursor)
-        insert_to_table(suppliers_df, 'suppliers', cursor)
-        insert_to_table(stores_df, 'stores', cursor)
-        insert_to_table(campaigns_df, 'campaigns', cursor)
-
-        conn.commit()
-    finally:
-        if conn:
-            conn.close()
+        if prepared_tables is None:
+            prepared_tables = read_prepared_tables()
+        sales_df = prepared_tables["sales"]
+        replaced_sales_df = warehouse.fetch_replaced_sales(sales_df) if incremental else sales_df.iloc[0:0]
+
+        # Insert data into the database, with the states of the sales moved to the states table
+        for table_name in TABLE_NAMES:
+            df = prepared_tables[table_name]
+            if table_name == "sales":
+                df = encode_states(warehouse, df)
+            warehouse.insert_to_table(df, table_name, upsert=incremental)
+
+        # Bring the derived tables up to date with the sales that were added or replaced
+        warehouse.update_derived_tables(
+            signed_sales_changes(sales_df, replaced_sales_df),
+            sale_dates_of(sales_df) | sale_dates_of(replaced_sales_df),
+            prepared_tables["customers"],
+            incremental,
+            sample_rates,
+        )
+
+        warehouse.commit()
 
 if __name__ == "__main__":
-    load_data_to_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the prepared data into the data warehouse.")
+    parser.add_argument("--incremental", action="store_true", help="Add to the existing records instead of replacing them.")
+    parser.add_argument("--backend", choices=list(WAREHOUSE_BACKENDS), default="sqlite", help="Warehouse backend to load into.")
+    parser.add_argument("--sample-rates", type=float, nargs="*", default=list(sales_samples.DEFAULT_SAMPLE_RATES),
+                        help="Rates of the stratified sales samples to maintain, e.g. 0.01 0.1.")
+    args = parser.parse_args()
+    load_data_to_db(incremental=args.incremental, backend=args.backend, sample_rates=args.sample_rates)
\ No newline at end of file
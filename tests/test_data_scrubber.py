@@ -13,6 +13,7 @@ This test suite verifies that each function in the DataScrubber class works as e
 import unittest
 import pathlib
 import sys
+import tempfile
 from io import StringIO
 import pandas as pd
 
@@ -23,6 +24,8 @@ if str(PROJECT_ROOT) not in sys.path:
 
 # Import DataScrubber from the scripts module
 from scripts.data_preparation.data_scrubber import DataScrubber  # noqa: E402
+from scripts.data_preparation.reject_sink import RejectSink  # noqa: E402
+from scripts.data_preparation.raw_files import SOURCE_FILE_COLUMN, iter_csv_files  # noqa: E402
 
 # Create a fake CSV file using StringIO
 csv_data = StringIO("""
@@ -63,6 +66,19 @@ class TestDataScrubber(unittest.TestCase):
         self.assertEqual(consistency['null_counts'].sum(), 0, "Null values not cleared in CLEAN stage")
         self.assertEqual(consistency['duplicate_count'], 0, "Duplicates not removed in CLEAN stage")
 
+    def test_apply_cleaning_spec(self):
+        spec = {
+            'upper': ['Name'],
+            'required': ['Score'],
+            'ranges': {'Score': (10, 25)},
+            'dates': {'Date': {'min': '2023-01-02', 'max': '2023-12-31'}},
+            'derived': {'StandardDate': ('standard_datetime', 'Date')},
+        }
+        df_cleaned = self.scrubber.apply_cleaning_spec(spec)
+        self.assertEqual(df_cleaned['ID'].tolist(), [2, 3, 5], "Rows not filtered by every rule")
+        self.assertTrue(df_cleaned['Name'].str.isupper().all(), "Strings not formatted to uppercase correctly")
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df_cleaned['StandardDate']), "Derived column not added correctly")
+
     def test_convert_column_to_new_data_type(self):
         df_converted = self.scrubber.convert_column_to_new_data_type('Score', 'float')
         self.assertEqual(df_converted['Score'].dtype, 'float64', "Data type not converted correctly")
@@ -103,6 +119,15 @@ class TestDataScrubber(unittest.TestCase):
         df_no_duplicates = self.scrubber.remove_duplicate_records()
         self.assertEqual(df_no_duplicates.duplicated().sum(), 0, "Duplicates not removed correctly")
 
+    def test_remove_duplicate_records_ignoring_columns(self):
+        df_tagged = df.assign(SourceFile=['a.csv'] * 5 + ['b.csv'])
+        df_tagged.loc[5, 'Score'] = 25  # The last file delivers the Eve row again
+        scrubber = DataScrubber(df_tagged)
+        df_no_duplicates = scrubber.remove_duplicate_records(ignore_columns=['SourceFile'])
+        self.assertEqual(df_no_duplicates['ID'].tolist(), [1, 2, 3, 4, 5], "Duplicates across source files not removed correctly")
+        with self.assertRaises(ValueError):
+            scrubber.remove_duplicate_records(ignore_columns=['Missing'])
+
     def test_rename_columns(self):
         df_renamed = self.scrubber.rename_columns({'ID': 'Identifier', 'Name': 'FullName'})
         self.assertIn('Identifier', df_renamed.columns, "Column ID not renamed correctly")
@@ -113,6 +138,93 @@ class TestDataScrubber(unittest.TestCase):
         self.assertEqual(df_reordered.columns.tolist(), ['Name', 'ID', 'Date'], "Columns not reordered correctly")
 
 
+    def test_find_near_duplicate_records(self):
+        customers = pd.DataFrame({
+            'CustomerID': [1, 2, 3, 4, 5],
+            'Name': ['William White', 'white, WILLIAM', 'Dan Brown', 'William Whte', 'Dan Browne'],
+            'Region': ['East', 'East', 'West', 'East', 'North'],
+            'Birthday': ['2002-04-22', '04/22/2002', '1964-06-22', '2002-04-22', '1964-06-22']})
+        merge_map = DataScrubber(customers).find_near_duplicate_records(
+            'CustomerID', 'Name', blocking_columns=['Region', 'Birthday'], date_columns=['Birthday'])
+        self.assertEqual(merge_map.values.tolist(), [[2, 1], [4, 1]], "Near-duplicates not mapped to the first record")
+
+    def test_cleaning_spec_rejects_recorded_with_first_failing_rule(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with RejectSink(pathlib.Path(tmp_dir)) as sink:
+                scrubber = DataScrubber(df.copy(), reject_sink=sink, table_name="scores")
+                scrubber.apply_cleaning_spec({'required': ['Score'], 'ranges': {'Score': (10, 25)}})
+            rejects = pd.read_parquet(pathlib.Path(tmp_dir).joinpath("scores.parquet"))
+        self.assertEqual(sorted(rejects['reason']), ['missing_required_value', 'value_out_of_range'], "Reason codes not recorded correctly")
+
+    def test_cleaning_spec_with_duplicate_index_labels(self):
+        df_dates = pd.DataFrame({'Date': ['2023-01-01', 'not-a-date', '2023-01-03']}, index=[0, 0, 1])
+        df_cleaned = DataScrubber(df_dates).apply_cleaning_spec({'dates': {'Date': {'min': '2020-01-01', 'max': '2030-01-01'}}})
+        self.assertEqual(df_cleaned['Date'].dt.day.tolist(), [1, 3], "Dates not kept by position")
+
+    def test_rejected_rows_keep_values_from_before_conversion(self):
+        df_bad_date = df.assign(Date=df['Date'].where(df['ID'] != 3, 'not-a-date'))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with RejectSink(pathlib.Path(tmp_dir)) as sink:
+                scrubber = DataScrubber(df_bad_date, reject_sink=sink, table_name="scores")
+                df_cleaned = scrubber.apply_cleaning_spec({'types': {'Date': 'datetime'}, 'required': ['Date']})
+            rejects = pd.read_parquet(pathlib.Path(tmp_dir).joinpath("scores.parquet"))
+        self.assertNotIn(3, df_cleaned['ID'].tolist(), "Row with an unparseable date not dropped")
+        self.assertEqual(rejects['reason'].tolist(), ['missing_required_value'], "Reason code not recorded correctly")
+        self.assertEqual(rejects['Date'].tolist(), ['not-a-date'], "Rejected row not recorded with its original value")
+
+    def test_rejected_rows_written_to_reject_sink(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with RejectSink(pathlib.Path(tmp_dir)) as sink:
+                scrubber = DataScrubber(df.copy(), reject_sink=sink, table_name="scores")
+                scrubber.filter_column_outliers('Score', 10, 25)
+                scrubber.remove_duplicate_records()
+            rejects = pd.read_parquet(pathlib.Path(tmp_dir).joinpath("scores.parquet"))
+        self.assertEqual(sink.rejected_count, 2, "Rejected row count not tracked correctly")
+        self.assertEqual(sorted(rejects['reason']), ['value_out_of_range', 'value_out_of_range'], "Reason codes not recorded correctly")
+        self.assertEqual(rejects.columns.tolist(), df.columns.tolist() + ['reason', 'source_index', 'rejected_at'],
+                         "Rejected rows not written with their own columns")
+        self.assertEqual(sorted(rejects['ID']), sorted(df.loc[~df['Score'].between(10, 25), 'ID']), "Rejected rows not recorded")
+
+    def test_rejected_rows_with_another_layout_written_to_another_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with RejectSink(pathlib.Path(tmp_dir)) as sink:
+                scrubber = DataScrubber(df.copy(), reject_sink=sink, table_name="scores")
+                scrubber.remove_duplicate_records(ignore_columns=['Score'])
+                scrubber.convert_column_to_new_data_type('ID', str)
+                scrubber.filter_column_outliers('Score', 10, 25)
+            first = pd.read_parquet(pathlib.Path(tmp_dir).joinpath("scores.parquet"))
+            second = pd.read_parquet(pathlib.Path(tmp_dir).joinpath("scores_2.parquet"))
+        self.assertEqual(first['ID'].tolist(), [5], "Rows dropped before the conversion not recorded as they were")
+        self.assertEqual(second['ID'].tolist(), ['4'], "Rows dropped after the conversion not recorded as they were")
+
+    def test_iter_csv_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = []
+            for part in range(4):
+                path = pathlib.Path(tmp_dir).joinpath(f"scores_{part}.csv")
+                df.iloc[part::4].rename(columns={'Name': ' Name '}).to_csv(path, index=False)
+                files.append((path, path.name))
+            for parse_workers in (1, 2):
+                frames = list(iter_csv_files(files, io_workers=2, parse_workers=parse_workers))
+                df_read = pd.concat(frames, ignore_index=True)
+                self.assertEqual([frame[SOURCE_FILE_COLUMN].unique().tolist() for frame in frames],
+                                 [[name] for _, name in files], "Files not yielded in order with their source file")
+                self.assertEqual(df_read.columns.tolist(), df.columns.tolist() + [SOURCE_FILE_COLUMN], "Column names not trimmed")
+                self.assertEqual(sorted(df_read['ID']), sorted(df['ID']), "Rows not read from every file")
+
+    def test_iter_csv_files_with_empty_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir).joinpath("scores_0.csv")
+            df.to_csv(path, index=False)
+            empty_path = pathlib.Path(tmp_dir).joinpath("scores_1.csv")
+            empty_path.touch()
+            files = [(path, path.name), (empty_path, empty_path.name)]
+            for parse_workers in (1, 2):
+                frames = list(iter_csv_files(files, io_workers=2, parse_workers=parse_workers))
+                self.assertEqual(len(frames[0]), len(df), "Rows not read from the non-empty file")
+                self.assertTrue(frames[1].empty and frames[1].columns.empty, "Empty file not read as a frame without columns")
+
+
 # Run the tests with verbosity=2 for detailed output
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
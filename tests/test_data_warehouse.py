@@ -0,0 +1,312 @@
+r"""
+tests/test_data_warehouse.py
+
+To run, open a terminal in the root project folder.
+Activate your virtual environment if needed, and run one of the following commands:
+
+    py tests\test_data_warehouse.py
+    python3 tests\test_data_warehouse.py
+
+This test suite loads small, known tables into a temporary data warehouse and verifies
+that the tables the ETL maintains alongside them stay correct across incremental loads.
+"""
+
+import importlib.util
+import unittest
+import pathlib
+import sqlite3
+import sys
+import tempfile
+from unittest import mock
+import pandas as pd
+
+# For local imports, temporarily add project root to Python sys.path
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+# The data preparation scripts import each other as top-level modules
+DATA_PREPARATION_DIR = PROJECT_ROOT.joinpath("scripts", "data_preparation")
+if str(DATA_PREPARATION_DIR) not in sys.path:
+    sys.path.append(str(DATA_PREPARATION_DIR))
+
+from scripts import etl_to_dw  # noqa: E402
+from scripts.data_preparation.reject_sink import RejectSink  # noqa: E402
+from scripts.data_warehouse import sales_leaderboards, sales_samples  # noqa: E402
+import data_prep  # noqa: E402
+
+
+SALES_COLUMNS = [
+    'TransactionID', 'SaleDate', 'CustomerID', 'ProductID', 'StoreID',
+    'CampaignID', 'SaleAmount', 'State', 'Discount', 'StateCode']
+
+
+def make_tables(sales_rows, referrers):
+    """Build a full set of prepared tables around the given sales rows and {CustomerID: ReferringCustomer}."""
+    sales = pd.DataFrame(sales_rows, columns=SALES_COLUMNS)
+    return {
+        'customers': pd.DataFrame({
+            'CustomerID': list(referrers), 'Name': [f'Customer {c}' for c in referrers], 'Region': 'East',
+            'JoinDate': '1/1/24', 'ReferringCustomer': pd.array(list(referrers.values()), dtype='Int64'),
+            'Birthday': '1990-01-01', 'StandardJoinDate': '2024-01-01'}),
+        'products': pd.DataFrame({
+            'ProductID': [10, 11], 'ProductName': ['hat', 'cable'], 'Category': ['Clothing', 'Electronics'],
+            'UnitPrice': [5.0, 2.0], 'Supplier': [100, 100], 'RemainingInventory': [1, 1]}),
+        'sales': sales,
+        'suppliers': pd.DataFrame({'SupplierID': [100], 'SupplierName': ['Dull']}),
+        'stores': pd.DataFrame({'StoreID': [401, 402], 'StoreName': ['A', 'B'], 'StoreLocation': ['X', 'Y']}),
+        'campaigns': pd.DataFrame({'CampaignID': [0], 'CampaignName': ['Podcast']}),
+    }
+
+
+FIRST_REFERRERS = {1: None, 2: 1, 3: 2}
+
+FIRST_LOAD = [
+    (1, '2024-01-01', 1, 10, 401, 0, 10.0, 'Texas', 0.0, 'TX'),
+    (2, '2024-01-01', 2, 11, 402, 0, 20.0, 'Ohio', 0.0, 'OH'),
+    (3, '2024-01-05', 2, 10, 401, 0, 30.0, 'Texas', 0.0, 'TX'),
+]
+
+SECOND_REFERRERS = {3: 1, 4: 3}  # moves customer 3 (and its tree) and adds customer 4
+
+SECOND_LOAD = [
+    (3, '2024-01-06', 2, 10, 401, 0, 35.0, 'Texas', 0.0, 'TX'),  # replaces an existing sale
+    (4, '2024-01-09', 3, 11, 402, 0, 40.0, 'Ohio', 0.0, 'OH'),
+    (5, '2024-01-09', 4, 11, 402, 0, 50.0, 'Ohio', 0.0, 'OH'),
+]
+
+REFERRAL_TABLE_QUERIES = [
+    "SELECT * FROM customer_referrals ORDER BY AncestorID, DescendantID",
+    "SELECT * FROM referral_sales ORDER BY CustomerID",
+    "SELECT * FROM referral_cuts ORDER BY CustomerID",
+]
+
+MAINTAINED_TABLE_QUERIES = [
+    "SELECT * FROM sales_daily ORDER BY GroupType, GroupKey, SaleDate",
+    *REFERRAL_TABLE_QUERIES,
+    "SELECT * FROM sales_totals ORDER BY EntityType, EntityID",
+    "SELECT * FROM sales_sample ORDER BY SampleRate, TransactionID",
+    "SELECT * FROM sales_sample_strata ORDER BY SampleRate, SaleMonth, Stratum",
+]
+
+
+def many_sales(count):
+    """Sales rows for two stores and two states in one month, with amounts spread between 1 and 100."""
+    return [(i, f'2024-02-{i % 28 + 1:02d}', 1, 10, 401 + i % 2, 0, float(i * 37 % 100 + 1),
+             'Texas' if i % 3 else 'Ohio', 0.0, 'TX' if i % 3 else 'OH') for i in range(1, count + 1)]
+
+
+class TestDataWarehouse(unittest.TestCase):
+
+    def setUp(self):
+        """Point the ETL at a fresh, temporary data warehouse."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = pathlib.Path(self.tmp_dir.name).joinpath("test.db")
+        patcher = mock.patch.object(etl_to_dw, "DB_PATH", self.db_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def query(self, sql, db_path=None):
+        with sqlite3.connect(db_path or self.db_path) as conn:
+            return pd.read_sql_query(sql, conn)
+
+    def load_incrementally_and_rebuild(self, loads=((FIRST_LOAD, FIRST_REFERRERS), (SECOND_LOAD, SECOND_REFERRERS))):
+        """Load the (sales rows, referrers) loads in turn, incrementally after the first, then rebuild the result from scratch in a second warehouse."""
+        for i, (sales_rows, referrers) in enumerate(loads):
+            etl_to_dw.load_data_to_db(make_tables(sales_rows, referrers), incremental=i > 0)
+        all_sales = self.query(f"SELECT {', '.join(SALES_COLUMNS)} FROM sales_with_state ORDER BY TransactionID")
+        all_customers = self.query("SELECT CustomerID, ReferringCustomer FROM customers")
+        referrers = {c: (None if pd.isna(r) else int(r)) for c, r in all_customers.values.tolist()}
+        rebuilt_path = pathlib.Path(self.tmp_dir.name).joinpath("rebuilt.db")
+        with mock.patch.object(etl_to_dw, "DB_PATH", rebuilt_path):
+            etl_to_dw.load_data_to_db(make_tables(all_sales.values.tolist(), referrers))
+        return rebuilt_path
+
+    def test_incremental_load_replaces_existing_sales(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS))
+        etl_to_dw.load_data_to_db(make_tables(SECOND_LOAD, SECOND_REFERRERS), incremental=True)
+        sales = self.query("SELECT TransactionID, SaleAmount FROM sales ORDER BY TransactionID")
+        self.assertEqual(sales['TransactionID'].tolist(), [1, 2, 3, 4, 5], "Incremental load did not keep existing sales")
+        self.assertEqual(sales['SaleAmount'].tolist(), [10.0, 20.0, 35.0, 40.0, 50.0], "Incremental load did not replace sales")
+
+    def test_maintained_tables_match_full_rebuild(self):
+        rebuilt_path = self.load_incrementally_and_rebuild()
+        for sql in MAINTAINED_TABLE_QUERIES:
+            with self.subTest(sql=sql):
+                pd.testing.assert_frame_equal(self.query(sql), self.query(sql, rebuilt_path))
+
+    def test_sales_daily_moving_averages(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS))
+        store = self.query("SELECT * FROM sales_daily WHERE GroupType = 'store' AND GroupKey = '401' ORDER BY SaleDate")
+        self.assertEqual(store['Revenue'].tolist(), [10.0, 30.0], "Daily revenue not aggregated correctly")
+        self.assertAlmostEqual(store['Revenue7DayAvg'].iloc[1], 40.0 / 7, msg="7-day average not computed correctly")
+        self.assertAlmostEqual(store['Revenue28DayAvg'].iloc[1], 40.0 / 28, msg="28-day average not computed correctly")
+
+    def test_sales_daily_refreshes_only_windows_of_touched_dates(self):
+        etl_to_dw.load_data_to_db(make_tables([
+            (1, '2024-01-01', 1, 10, 401, 0, 10.0, 'Texas', 0.0, 'TX'),
+            (2, '2024-06-01', 1, 10, 401, 0, 20.0, 'Texas', 0.0, 'TX'),
+            (3, '2024-12-01', 1, 10, 401, 0, 30.0, 'Texas', 0.0, 'TX'),
+        ], FIRST_REFERRERS))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE sales_daily SET Revenue7DayAvg = -1 WHERE SaleDate = '2024-06-01'")
+        etl_to_dw.load_data_to_db(make_tables([
+            (4, '2024-01-02', 1, 10, 401, 0, 40.0, 'Texas', 0.0, 'TX'),
+            (5, '2024-12-02', 1, 10, 401, 0, 50.0, 'Texas', 0.0, 'TX'),
+        ], FIRST_REFERRERS), incremental=True)
+        store = self.query("SELECT SaleDate, Revenue7DayAvg FROM sales_daily WHERE GroupType = 'store' ORDER BY SaleDate")
+        self.assertEqual(store.set_index('SaleDate')['Revenue7DayAvg'].round(6).to_dict(), {
+            '2024-01-01': round(10.0 / 7, 6), '2024-01-02': round(50.0 / 7, 6), '2024-06-01': -1.0,
+            '2024-12-01': round(30.0 / 7, 6), '2024-12-02': round(80.0 / 7, 6)},
+            "Moving averages not refreshed for exactly the windows of the touched dates")
+
+
+    def test_referral_closure_and_downstream_sales(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS))
+        downstream = self.query("SELECT DescendantID, Depth FROM customer_referrals WHERE AncestorID = 1 ORDER BY Depth")
+        self.assertEqual(downstream.values.tolist(), [[1, 0], [2, 1], [3, 2]], "Referral chain not closed correctly")
+        referral_sales = self.query("SELECT DownstreamCustomers, DownstreamSales FROM referral_sales WHERE CustomerID = 1")
+        self.assertEqual(referral_sales.values.tolist(), [[2, 50.0]], "Downstream sales not aggregated correctly")
+
+    def test_referral_loop_is_cut(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, {1: 3, 2: 1, 3: 2}))
+        closure = self.query("SELECT AncestorID, DescendantID FROM customer_referrals WHERE Depth > 0 ORDER BY 1, 2")
+        self.assertEqual(len(closure), 3, "Referral loop not cut into a chain")
+        self.assertEqual(len(closure[closure['AncestorID'] == closure['DescendantID']]), 0, "Customer is its own referrer")
+        self.assertEqual(len(self.query("SELECT * FROM referral_cuts")), 1, "Cut referral not recorded")
+
+    def test_referral_cut_as_loop_is_reattached(self):
+        # Customer 1 referred by 2 closes a loop until 2 stops being referred by 1
+        rebuilt_path = self.load_incrementally_and_rebuild(
+            [(FIRST_LOAD, {1: None, 2: 1}), (FIRST_LOAD, {1: 2}), (FIRST_LOAD, {2: None})])
+        closure = self.query("SELECT AncestorID, DescendantID FROM customer_referrals WHERE Depth > 0")
+        self.assertEqual(closure.values.tolist(), [[2, 1]], "Referral cut as a loop not re-attached")
+        for sql in REFERRAL_TABLE_QUERIES:
+            with self.subTest(sql=sql):
+                pd.testing.assert_frame_equal(self.query(sql), self.query(sql, rebuilt_path))
+
+    def test_unreferenced_referrer_is_removed(self):
+        # Customer 9 is only known as customer 2's referrer, until 2 is referred by 1 instead
+        rebuilt_path = self.load_incrementally_and_rebuild([(FIRST_LOAD, {1: None, 2: 9}), (FIRST_LOAD, {2: 1})])
+        self.assertEqual(self.query("SELECT * FROM customer_referrals WHERE AncestorID = 9 OR DescendantID = 9").empty, True,
+                         "Unreferenced referrer left in customer_referrals")
+        for sql in REFERRAL_TABLE_QUERIES:
+            with self.subTest(sql=sql):
+                pd.testing.assert_frame_equal(self.query(sql), self.query(sql, rebuilt_path))
+
+
+    def test_sales_store_state_key(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS))
+        states_before = self.query("SELECT * FROM states ORDER BY StateKey")
+        etl_to_dw.load_data_to_db(make_tables(SECOND_LOAD + [(6, '2024-01-09', 4, 11, 402, 0, 5.0, ' Texas', 0.0, 'TX')],
+                                              SECOND_REFERRERS), incremental=True)
+        self.assertNotIn('StateCode', self.query("SELECT * FROM sales").columns, "State columns still stored on sales")
+        states = self.query("SELECT * FROM states ORDER BY StateKey")
+        self.assertEqual(len(states), 3, "States not stored once per distinct State and StateCode")
+        pd.testing.assert_frame_equal(states.head(len(states_before)), states_before, obj="Existing state keys")
+        sales = self.query(f"SELECT {', '.join(SALES_COLUMNS)} FROM sales_with_state ORDER BY TransactionID")
+        expected = pd.DataFrame(FIRST_LOAD[:2] + SECOND_LOAD + [(6, '2024-01-09', 4, 11, 402, 0, 5.0, ' Texas', 0.0, 'TX')],
+                                columns=SALES_COLUMNS)
+        pd.testing.assert_frame_equal(sales, expected, obj="sales_with_state")
+
+    def test_sales_table_with_state_columns_is_migrated(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE sales (TransactionID INTEGER PRIMARY KEY, CustomerID INTEGER, ProductID INTEGER, "
+                         "StoreID INTEGER, CampaignID INTEGER, SaleAmount REAL, SaleDate TEXT, State TEXT, "
+                         "Discount REAL, StateCode TEXT)")
+            pd.DataFrame(FIRST_LOAD, columns=SALES_COLUMNS).to_sql('sales', conn, if_exists='append', index=False)
+        etl_to_dw.load_data_to_db(make_tables(SECOND_LOAD, SECOND_REFERRERS), incremental=True)
+        sales = self.query("SELECT TransactionID, StateCode FROM sales_with_state ORDER BY TransactionID")
+        self.assertEqual(sales.values.tolist(), [[1, 'TX'], [2, 'OH'], [3, 'TX'], [4, 'OH'], [5, 'OH']],
+                         "Existing sales not migrated to state keys")
+
+    def test_leaderboard_after_incremental_load(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS))
+        etl_to_dw.load_data_to_db(make_tables(SECOND_LOAD, SECOND_REFERRERS), incremental=True)
+        with sqlite3.connect(self.db_path) as conn:
+            top_customers = sales_leaderboards.top_k(conn.cursor(), 'customer', 2)
+        self.assertEqual(top_customers['CustomerID'].tolist(), [2, 4], "Customers not ranked by total sales")
+        self.assertEqual(top_customers['TotalSales'].tolist(), [55.0, 50.0], "Customer totals not maintained correctly")
+
+    def test_approximate_aggregate_is_exact_when_strata_are_fully_sampled(self):
+        etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS))
+        with sqlite3.connect(self.db_path) as conn:
+            estimate = sales_samples.approximate_aggregate(conn.cursor(), 'sum', group_by=['StateCode'])
+        self.assertEqual(estimate['StateCode'].tolist(), ['OH', 'TX'], "Groups not estimated")
+        self.assertEqual(estimate['Estimate'].tolist(), [20.0, 40.0], "Fully sampled strata not summed exactly")
+        self.assertEqual(estimate['StdError'].tolist(), [0.0, 0.0], "Fully sampled strata should have no error")
+
+    def test_approximate_aggregate_bounds(self):
+        sales = many_sales(3000)
+        etl_to_dw.load_data_to_db(make_tables(sales, FIRST_REFERRERS), sample_rates=[0.05])
+        sample_size = self.query("SELECT COUNT(*) FROM sales_sample").iloc[0, 0]
+        self.assertEqual(sample_size, 150, "Strata not sampled at the sample rate")
+        exact = pd.DataFrame(sales, columns=SALES_COLUMNS).query("SaleAmount > 50")
+        with sqlite3.connect(self.db_path) as conn:
+            for aggregate, true_value in (('sum', exact['SaleAmount'].sum()), ('count', len(exact)),
+                                          ('avg', exact['SaleAmount'].mean())):
+                with self.subTest(aggregate=aggregate):
+                    estimate = sales_samples.approximate_aggregate(
+                        conn.cursor(), aggregate, where="SaleAmount > ?", params=(50,), rate=0.05).iloc[0]
+                    self.assertGreater(estimate['StdError'], 0, "Sampled strata should have an error")
+                    self.assertTrue(estimate['Lower'] <= true_value <= estimate['Upper'], "True value outside the bounds")
+
+    def test_approximate_aggregate_of_integer_value(self):
+        etl_to_dw.load_data_to_db(make_tables(many_sales(3000), FIRST_REFERRERS), sample_rates=[0.05])
+        with sqlite3.connect(self.db_path) as conn:
+            as_int = sales_samples.approximate_aggregate(conn.cursor(), 'sum', value="SaleAmount > 50", rate=0.05)
+            as_real = sales_samples.approximate_aggregate(conn.cursor(), 'sum', value="(SaleAmount > 50) * 1.0", rate=0.05)
+        pd.testing.assert_frame_equal(as_int, as_real, obj="Estimate of an integer value")
+
+    def test_small_strata_are_pooled_by_state_code(self):
+        sales = [(i, '2024-02-01', 1, 10, 401 + i % 100, 0, 1.0, 'Texas' if i % 2 else ' Texas', 0.0, 'TX')
+                 for i in range(1, 1001)]
+        etl_to_dw.load_data_to_db(make_tables(sales, FIRST_REFERRERS), sample_rates=[0.1])
+        strata = self.query("SELECT Stratum, StratumRows, SampleRows FROM sales_sample_strata")
+        self.assertEqual(strata.values.tolist(), [['state TX', 1000, 100]],
+                         "Stores' few sales not pooled in one stratum per state code")
+
+    def test_sample_rates_can_change(self):
+        etl_to_dw.load_data_to_db(make_tables(many_sales(1000), FIRST_REFERRERS), sample_rates=[0.1, 0.5])
+        etl_to_dw.load_data_to_db(make_tables(SECOND_LOAD, SECOND_REFERRERS), incremental=True, sample_rates=[0.1, 0.2])
+        rates = self.query("SELECT SampleRate, SUM(StratumRows) AS StratumRows FROM sales_sample_strata GROUP BY SampleRate")
+        self.assertEqual(rates.values.tolist(), [[0.1, 1000], [0.2, 1000]], "Sample rates not rebuilt or dropped")
+        with sqlite3.connect(self.db_path) as conn, self.assertRaises(ValueError):
+            sales_samples.approximate_aggregate(conn.cursor(), rate=0.5)
+
+    @unittest.skipUnless(importlib.util.find_spec("duckdb"), "duckdb is not installed")
+    def test_duckdb_backend_matches_sqlite(self):
+        duckdb_path = pathlib.Path(self.tmp_dir.name).joinpath("test.duckdb")
+        with mock.patch.object(etl_to_dw, "DUCKDB_PATH", duckdb_path):
+            for backend in etl_to_dw.WAREHOUSE_BACKENDS:
+                etl_to_dw.load_data_to_db(make_tables(FIRST_LOAD, FIRST_REFERRERS), backend=backend)
+                etl_to_dw.load_data_to_db(make_tables(SECOND_LOAD, SECOND_REFERRERS), incremental=True, backend=backend)
+            sql = "SELECT StateCode, SUM(SaleAmount) AS TotalSales, COUNT(*) AS Sales FROM sales_with_state GROUP BY StateCode ORDER BY StateCode"
+            with etl_to_dw.open_warehouse("sqlite") as sqlite_dw, etl_to_dw.open_warehouse("duckdb") as duckdb_dw:
+                pd.testing.assert_frame_equal(duckdb_dw.query(sql), sqlite_dw.query(sql), check_dtype=False)
+
+    def test_in_process_load_matches_csv_load(self):
+        tmp_path = pathlib.Path(self.tmp_dir.name)
+        with RejectSink(tmp_path.joinpath("rejects")) as sink:
+            prepared, _ = data_prep.prepare_all_tables(sink, save=False)
+        etl_to_dw.load_data_to_db({name: data_prep.to_arrow_frame(df) for name, df in prepared.items()})
+
+        prepared_dir = tmp_path.joinpath("prepared")
+        prepared_dir.mkdir()
+        for table_name, df in prepared.items():
+            df.to_csv(prepared_dir.joinpath(f"{table_name}_data_prepared.csv"), index=False)
+        csv_path = tmp_path.joinpath("from_csv.db")
+        with mock.patch.object(etl_to_dw, "PREPARED_DATA_DIR", prepared_dir), mock.patch.object(etl_to_dw, "DB_PATH", csv_path):
+            etl_to_dw.load_data_to_db()
+
+        self.assertGreater(len(self.query("SELECT * FROM sales")), 0, "Prepared sales not loaded")
+        tables = self.query("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') ORDER BY name")['name']
+        for table in tables:
+            with self.subTest(table=table):
+                pd.testing.assert_frame_equal(self.query(f"SELECT * FROM {table}"), self.query(f"SELECT * FROM {table}", csv_path))
+
+
+# Run the tests with verbosity=2 for detailed output
+if __name__ == "__main__":
+    unittest.main(verbosity=2)